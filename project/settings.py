@@ -446,6 +446,7 @@ LOW_PRI_MODULES = {
 # Default priority is implicit
 # DEFAULT_PRI_MODULES = {
 #     'share.tasks.NormalizerTask',
+#     'share.tasks.BatchNormalizerTask',
 # }
 
 MED_PRI_MODULES = {
@@ -534,6 +535,14 @@ OSF_API_URL = os.environ.get('OSF_API_URL', 'https://staging-api.osf.io').rstrip
 SITE_ID = 1
 DOI_BASE_URL = os.environ.get('DOI_BASE_URL', 'http://dx.doi.org/')
 
+# Harvester Settings
+# Rate limits are shared by every harvester of a provider, across threads and worker processes
+HARVESTER_RATE_LIMITER = os.environ.get('HARVESTER_RATE_LIMITER', 'share.harvest.ratelimit.FileRateLimiter')
+HARVESTER_RATE_LIMIT_DIR = os.environ.get('HARVESTER_RATE_LIMIT_DIR', None)
+# One of passthrough, record or replay. See share.harvest.cache
+HARVESTER_HTTP_CACHE = os.environ.get('HARVESTER_HTTP_CACHE', 'passthrough')
+HARVESTER_HTTP_CACHE_DIR = os.environ.get('HARVESTER_HTTP_CACHE_DIR', os.path.join(BASE_DIR, '.harvester-cache'))
+
 # API KEYS
 DATAVERSE_API_KEY = os.environ.get('DATAVERSE_API_KEY')
 PLOS_API_KEY = os.environ.get('PLOS_API_KEY')
@@ -1,11 +1,12 @@
+import math
 from datetime import timedelta
 
 from furl import furl
 
-from share import Harvester
+from share.harvest.paginated import PaginatedHarvester
 
 
-class FigshareHarvester(Harvester):
+class FigshareHarvester(PaginatedHarvester):
     url = 'https://api.figshare.com/v1/articles/search'
 
     # Other harvesters should not have to implement this method
@@ -18,32 +19,24 @@ class FigshareHarvester(Harvester):
         """
         return (start_date - timedelta(days=1)), (end_date - timedelta(days=1))
 
-    def do_harvest(self, start_date, end_date):
+    def first_page(self, start_date, end_date):
         # Inputs are a DateTime object, many APIs only accept dates
         end_date = end_date.date()
         start_date = start_date.date()
 
-        # Fetch records is a separate function for readability
-        # Ends up returning a list of tuples with provider given id and the document itself
-        return self.fetch_records(furl(self.url).set(query_params={
+        return furl(self.url).set(query_params={
             'search_for': '*',
             'to_date': end_date.isoformat(),
             'from_date': start_date.isoformat(),
-        }).url)
-
-    def fetch_records(self, url):
-        count, page = 0, 1
-
-        resp = self.requests.get(url)
-        total = resp.json()['items_found']
-
-        while True:
-            if count >= total:
-                break
-
-            for item in resp.json()['items']:
-                count += 1
-                yield (item['article_id'], item)
-
-            page += 1
-            resp = self.requests.get(furl(url).add(query_params={'page': page}).url)
+        }).url
+
+    def page_urls(self, url, page):
+        # The page size is not configurable, infer it from the first page
+        if not page['items']:
+            return []
+        pages = math.ceil(page['items_found'] / len(page['items']))
+        return [furl(url).add(query_params={'page': i}).url for i in range(2, pages + 1)]
+
+    def get_records(self, page):
+        for item in page['items']:
+            yield (item['article_id'], item)
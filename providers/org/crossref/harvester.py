@@ -1,38 +1,31 @@
 from furl import furl
 
-from share import Harvester
+from share.harvest.paginated import PaginatedHarvester
 
 
-class CrossRefHarvester(Harvester):
+class CrossRefHarvester(PaginatedHarvester):
     url = 'https://api.crossref.org/v1/works'
+    rows = 1000
 
-    def do_harvest(self, start_date, end_date):
+    def first_page(self, start_date, end_date):
         start_date = start_date.date()
         end_date = end_date.date()
 
-        return self.fetch_records(furl(self.url).set(query_params={
+        return furl(self.url).set(query_params={
             'filter': 'from-update-date:{},until-update-date:{}'.format(
                 start_date.isoformat(),
                 end_date.isoformat()
             ),
-            'rows': 1000
-        }).url)
-
-    def fetch_records(self, url):
-        resp = self.requests.get(url)
-        total = resp.json()['message']['total-results']
-        records = resp.json()['message']['items']
-
-        # return the first 1000 records
-        for record in records:
-            yield (record['DOI'], record)
+            'rows': self.rows
+        }).url
 
+    def page_urls(self, url, page):
         # make requests for the remaining records
-        for i in range(1000, total, 1000):
-            response = self.requests.get(furl(url).add(query_params={
-                'offset': i
-            }).url)
+        return [
+            furl(url).add(query_params={'offset': i}).url
+            for i in range(self.rows, page['message']['total-results'], self.rows)
+        ]
 
-            records = response.json()['message']['items']
-            for record in records:
-                yield (record['DOI'], record)
+    def get_records(self, page):
+        for record in page['message']['items']:
+            yield (record['DOI'], record)
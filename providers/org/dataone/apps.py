@@ -9,3 +9,4 @@ class AppConfig(ProviderAppConfig):
     long_title = 'DataONE: Data Observation Network for Earth'
     home_page = 'https://www.dataone.org/'
     harvester = DataOneHarvester
+    native_xpath = True
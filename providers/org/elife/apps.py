@@ -9,6 +9,7 @@ class AppConfig(ProviderAppConfig):
     long_title = 'eLife Sciences'
     home_page = 'http://elifesciences.org/'
     harvester = ELifeHarvester
+    native_xpath = True
     rate_limit = (1, 60)
     namespaces = {
         'http://www.w3.org/1999/xlink': None,
@@ -8,4 +8,5 @@ class AppConfig(ProviderAppConfig):
     long_title = 'Public Library of Science'
     home_page = 'https://plos.org/'
     harvester = PLOSHarvester
+    native_xpath = True
     version = '0.0.0'
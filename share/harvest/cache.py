@@ -0,0 +1,98 @@
+import io
+import os
+import gzip
+import json
+import logging
+import hashlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class HTTPCache:
+    """An on-disk cache of provider responses for recording and replaying harvests.
+
+    Modes:
+        passthrough: The cache is not used
+        record: Every request is sent to the provider and its response is stored, replacing any previous recording
+        replay: Responses are only ever read from the cache. Requests that were never recorded raise CacheMiss
+
+    Responses are keyed by the request method, fully resolved URL, including query parameters, and body.
+    Each one is stored gzipped, as a line of JSON describing the response followed by its body.
+    """
+
+    MODES = ('passthrough', 'record', 'replay')
+
+    def __init__(self, directory: str, mode: str='passthrough'):
+        assert mode in self.MODES, 'mode must be one of {}, found {}'.format(self.MODES, mode)
+        self.directory = directory
+        self.mode = mode
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'passthrough'
+
+    def key(self, request: requests.PreparedRequest) -> str:
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode()
+        return hashlib.sha256(request.method.encode() + b' ' + request.url.encode() + b'\n' + body).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.gz')
+
+    def get(self, request: requests.PreparedRequest) -> requests.Response:
+        try:
+            with gzip.open(self.path(self.key(request)), 'rb') as fobj:
+                meta = json.loads(fobj.readline().decode())
+                content = fobj.read()
+        except FileNotFoundError:
+            raise CacheMiss('No recorded response for {} {}'.format(request.method, request.url))
+
+        logger.debug('Replaying recorded response for %s %s', request.method, request.url)
+
+        resp = requests.Response()
+        resp.status_code = meta['status']
+        resp.reason = meta['reason']
+        resp.headers = CaseInsensitiveDict(meta['headers'])
+        resp.url = meta['url']
+        resp.request = request
+        resp.raw = _RecordedBody(content)
+        resp._content = content
+        resp._content_consumed = True
+        return resp
+
+    def put(self, request: requests.PreparedRequest, resp: requests.Response) -> None:
+        path = self.path(self.key(request))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        headers = dict(resp.headers)
+        # The body is stored decoded
+        headers.pop('Content-Encoding', None)
+        headers.pop('Content-Length', None)
+
+        # Write then rename so a concurrent reader never sees a partial recording
+        with gzip.open(path + '.tmp', 'wb') as fobj:
+            fobj.write(json.dumps({
+                'url': resp.url,
+                'status': resp.status_code,
+                'reason': resp.reason,
+                'headers': headers,
+            }).encode() + b'\n')
+            fobj.write(resp.content)
+        os.replace(path + '.tmp', path)
+
+        logger.debug('Recorded response for %s %s', request.method, request.url)
+
+
+class _RecordedBody(io.BytesIO):
+    # Allows Response.close to be called on replayed responses
+
+    def release_conn(self):
+        pass
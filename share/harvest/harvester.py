@@ -1,44 +1,71 @@
+import os
 import abc
 import json
-import time
+import queue
 import types
 import logging
+import threading
 import datetime
+from hashlib import sha256
 from typing import Tuple
 from typing import Union
+from typing import Callable
 from typing import Iterator
 
 import arrow
 import requests
 
+from django.conf import settings
 from django.db import transaction
 from django.utils.functional import cached_property
 
+from share.harvest.cache import HTTPCache
+from share.harvest.ratelimit import get_rate_limiter
+from share.harvest.session import HarvesterSession
+
 logger = logging.getLogger(__name__)
 
 
 class Harvester(metaclass=abc.ABCMeta):
 
-    # TODO Make this apply across threads
     rate_limit = (5, 1)  # Rate limit in requests per_second
+    timeout = 30  # Seconds to wait on connecting to or reading from the provider
+    retries = 3  # Number of times to retry connection errors and read timeouts
+    pool_size = 10  # Number of keep-alive connections to hold per host
+    batch_size = 500  # Number of documents to store per transaction
+    prefetch = 0  # Number of documents to fetch ahead in a background thread, should be at least a page. 0 disables prefetching
+
+    _PREFETCH_DONE = object()
 
     def __init__(self, app_config):
-        self.last_call = 0
         self.config = app_config
         self.rate_limit = getattr(self.config, 'rate_limit', self.rate_limit)
-        self.allowance = self.rate_limit[0]
+        self.timeout = getattr(self.config, 'timeout', self.timeout)
+        self.retries = getattr(self.config, 'retries', self.retries)
+        self.pool_size = getattr(self.config, 'pool_size', self.pool_size)
+        self.batch_size = getattr(self.config, 'batch_size', self.batch_size)
+        self.prefetch = getattr(self.config, 'prefetch', self.prefetch)
+        # Record or replay HTTP responses, see share.harvest.cache
+        self.http_cache = getattr(self.config, 'http_cache', None) or settings.HARVESTER_HTTP_CACHE
+        self.http_cache_dir = settings.HARVESTER_HTTP_CACHE_DIR
+        # Provider specific position in the current harvest, see do_harvest
+        self.cursor = None
+        # Shared by every harvester instance for this provider, see settings.HARVESTER_RATE_LIMITER
+        self.rate_limiter = get_rate_limiter(self.config.label, self.rate_limit)
+
+    @cached_property
+    def session(self) -> HarvesterSession:
+        return HarvesterSession(
+            rate_limiter=self.rate_limiter,
+            timeout=self.timeout,
+            retries=self.retries,
+            pool_size=self.pool_size,
+            cache=HTTPCache(os.path.join(self.http_cache_dir, self.config.label), mode=self.http_cache),
+        )
 
     @property
-    def requests(self) -> requests:
-        if self.allowance < 1:
-            try:
-                time.sleep(self.rate_limit[1] - (time.time() - self.last_call))
-            except ValueError:
-                pass  # ValueError indicates a negative sleep time
-            self.allowance = self.rate_limit[0]
-        self.allowance -= 1
-        self.last_call = time.time()
-        return requests
+    def requests(self) -> requests.Session:
+        return self.session
 
     @cached_property
     def source(self):
@@ -49,7 +76,12 @@ class Harvester(metaclass=abc.ABCMeta):
         """Fetch date from this provider inside of the given date range.
 
         Any HTTP[S] requests MUST be sent using the self.requests client.
-        It will automatically in force rate limits
+        It will automatically in force rate limits and reuse connections
+
+        Harvesters that are able to resume part way through a date range should
+        set self.cursor to a JSON serializable value that will re-fetch the data
+        currently being yielded, IE the resumption token or offset of the current page.
+        When resuming, self.cursor will be set to that value before do_harvest is called.
 
         Args:
             start_date (datetime):
@@ -80,30 +112,148 @@ class Harvester(metaclass=abc.ABCMeta):
         """
         return start_date, end_date
 
-    def harvest(self, start_date: [datetime.datetime, datetime.timedelta, arrow.Arrow], end_date: [datetime.datetime, datetime.timedelta, arrow.Arrow], shift_range: bool=True) -> list:
-        from share.models import RawData
+    def harvest(self, start_date: [datetime.datetime, datetime.timedelta, arrow.Arrow], end_date: [datetime.datetime, datetime.timedelta, arrow.Arrow], shift_range: bool=True, checkpoint: dict=None, on_checkpoint: Callable[[dict], None]=None, unchanged: bool=False) -> Iterator['RawData']:
+        """Fetch and store data from this provider inside of the given date range.
+
+        Data is committed in batches of self.batch_size and each RawData is yielded as soon as its batch is committed.
+        After every batch, on_checkpoint is called with a dict describing how far the harvest has gotten.
+        Passing that dict back in as checkpoint will resume the harvest from the last committed batch.
+
+        Exact copies of previously stored documents are found with a single query per batch and are not written again.
+
+        Args:
+            start_date (datetime):
+            end_date (datetime):
+            checkpoint (dict): A checkpoint previously given to on_checkpoint
+            on_checkpoint (callable): Called with a JSON serializable dict after every committed batch
+            unchanged (bool): Also yield exact copies of previously stored data
+
+        Returns:
+            Iterator<RawData>: The stored data, and, if unchanged is True, exact copies of previously stored data.
+        """
         start_date, end_date = self._validate_dates(start_date, end_date)
 
+        checkpoint = checkpoint or {}
+        count, self.cursor = checkpoint.get('count', 0), checkpoint.get('cursor')
+        # The number of documents fetched from cursor that were stored before the harvest was interrupted.
+        # They will be fetched again, as cursor always re-fetches the data that was current, and must not be counted twice.
+        # cursor may be None when resuming, as some providers have no cursor for their first page
+        skip = checkpoint.get('offset', 0) if 'cursor' in checkpoint else 0
+        if 'cursor' in checkpoint:
+            logger.info('Resuming harvest of %s after %d documents from %r, skipping %d', self.config.label, count, self.cursor, skip)
+
+        batch, cursor, offset, resumed = [], self.cursor, 0, self.cursor
+        for current, doc_id, datum in self._do_harvest(start_date, end_date):
+            offset = offset + 1 if current == cursor else 1
+            cursor = current
+
+            if skip:
+                if cursor == resumed and offset <= skip:
+                    continue
+                skip = 0
+
+            batch.append((doc_id, self.encode_data(datum)))
+            if len(batch) < self.batch_size:
+                continue
+            count += len(batch)
+            yield from self._store_batch(batch, {'count': count, 'cursor': cursor, 'offset': offset}, on_checkpoint, unchanged=unchanged)
+            batch = []
+
+        if batch:
+            count += len(batch)
+            yield from self._store_batch(batch, {'count': count, 'cursor': cursor, 'offset': offset}, on_checkpoint, unchanged=unchanged)
+
+    def _store_batch(self, batch: list, checkpoint: dict, on_checkpoint: Callable[[dict], None]=None, unchanged: bool=False) -> list:
+        from share.models import RawData
+
+        keys = [(doc_id, sha256(datum).hexdigest()) for doc_id, datum in batch]
+        existing = RawData.objects.find_stored(keys, self.source)
+        changed = [document for key, document in zip(keys, batch) if key not in existing]
+
         stored = []
-        with transaction.atomic():
-            rawdata = self.do_harvest(start_date, end_date)
-            assert isinstance(rawdata, types.GeneratorType), 'do_harvest did not return a generator type, found {!r}. Make sure to use the yield keyword'.format(type(rawdata))
+        if changed:
+            with transaction.atomic():
+                stored = [raw for raw, created in RawData.objects.bulk_store_data(changed, self.source, self.config.label)]
 
-            for doc_id, datum in rawdata:
-                stored.append(RawData.objects.store_data(doc_id, self.encode_data(datum), self.source, self.config.label))
+        logger.debug('Committed %d documents from %s, skipped %d unchanged, %d total', len(stored), self.config.label, len(batch) - len(changed), checkpoint['count'])
+        if on_checkpoint:
+            on_checkpoint(checkpoint)
+
+        if not unchanged:
+            return stored
 
-        return stored
+        stored = iter(stored)
+        return [
+            RawData(id=existing[key], source=self.source, app_label=self.config.label, provider_doc_id=key[0], sha256=key[1], data=datum)
+            if key in existing else next(stored)
+            for key, (_, datum) in zip(keys, batch)
+        ]
 
     def raw(self, start_date: [datetime.datetime, datetime.timedelta, arrow.Arrow], end_date: [datetime.datetime, datetime.timedelta, arrow.Arrow], shift_range: bool=True, limit: int=None) -> list:
         start_date, end_date = self._validate_dates(start_date, end_date)
-        count, harvest = 0, self.do_harvest(start_date, end_date)
-        assert isinstance(harvest, types.GeneratorType), 'do_harvest did not return a generator type, found {!r}. Make sure to use the yield keyword'.format(type(harvest))
-
-        for doc_id, datum in harvest:
-            yield doc_id, self.encode_data(datum, pretty=True)
-            count += 1
-            if limit and count >= limit:
-                break
+        self.cursor = None
+        count, harvest = 0, self._do_harvest(start_date, end_date)
+
+        try:
+            for _, doc_id, datum in harvest:
+                yield doc_id, self.encode_data(datum, pretty=True)
+                count += 1
+                if limit and count >= limit:
+                    break
+        finally:
+            harvest.close()
+
+    def _do_harvest(self, start_date: arrow.Arrow, end_date: arrow.Arrow) -> Iterator[Tuple[object, str, Union[str, dict, bytes]]]:
+        """Run do_harvest, pairing each document with the cursor that was current when it was yielded.
+
+        If self.prefetch is set, do_harvest is run in a background thread which keeps up to
+        self.prefetch documents ready, so the next page may be fetched while the current one is being stored.
+        """
+        rawdata = self.do_harvest(start_date, end_date)
+        assert isinstance(rawdata, types.GeneratorType), 'do_harvest did not return a generator type, found {!r}. Make sure to use the yield keyword'.format(type(rawdata))
+
+        if not self.prefetch:
+            for doc_id, datum in rawdata:
+                yield self.cursor, doc_id, datum
+            return
+
+        buffer, stop = queue.Queue(maxsize=self.prefetch), threading.Event()
+
+        def produce():
+            try:
+                for doc_id, datum in rawdata:
+                    item = (self.cursor, doc_id, datum)
+                    while not stop.is_set():
+                        try:
+                            buffer.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    else:
+                        return rawdata.close()
+                item = (self._PREFETCH_DONE, None, None)
+            except BaseException as e:
+                item = (self._PREFETCH_DONE, e, None)
+            while not stop.is_set():
+                try:
+                    return buffer.put(item, timeout=0.1)
+                except queue.Full:
+                    continue
+
+        producer = threading.Thread(target=produce, name='{}-prefetch'.format(self.config.label), daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                cursor, doc_id, datum = buffer.get()
+                if cursor is self._PREFETCH_DONE:
+                    if doc_id is not None:
+                        raise doc_id
+                    return
+                yield cursor, doc_id, datum
+        finally:
+            stop.set()
+            producer.join()
 
     def encode_data(self, data, pretty=False) -> bytes:
         if isinstance(data, bytes):
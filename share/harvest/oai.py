@@ -1,5 +1,8 @@
 import abc
 import logging
+import itertools
+from typing import Tuple
+from typing import Iterator
 
 import arrow
 from furl import furl
@@ -10,6 +13,13 @@ from .harvester import Harvester
 logger = logging.getLogger(__name__)
 
 
+class OAIError(Exception):
+
+    def __init__(self, code, message):
+        self.code = code
+        super().__init__('{}: {}'.format(code, message))
+
+
 class OAIHarvester(Harvester, metaclass=abc.ABCMeta):
 
     namespaces = {
@@ -19,6 +29,12 @@ class OAIHarvester(Harvester, metaclass=abc.ABCMeta):
     }
     url = None
     time_granularity = True
+    streaming = True  # Incrementally parse pages rather than loading them entirely into memory
+    chunk_size = 64 * 1024
+
+    RECORD_TAG = '{http://www.openarchives.org/OAI/2.0/}record'
+    TOKEN_TAG = '{http://www.openarchives.org/OAI/2.0/}resumptionToken'
+    ERROR_TAG = '{http://www.openarchives.org/OAI/2.0/}error'
 
     def __init__(self, app_config):
         super().__init__(app_config)
@@ -28,6 +44,8 @@ class OAIHarvester(Harvester, metaclass=abc.ABCMeta):
             raise NotImplementedError('url')
 
         self.time_granularity = getattr(self.config, 'time_granularity', self.time_granularity)
+        self.streaming = getattr(self.config, 'streaming', self.streaming)
+        self.token_expires = None
 
     def do_harvest(self, start_date: arrow.Arrow, end_date: arrow.Arrow) -> list:
         url = furl(self.url)
@@ -44,35 +62,147 @@ class OAIHarvester(Harvester, metaclass=abc.ABCMeta):
         return self.fetch_records(url)
 
     def fetch_records(self, url: furl) -> list:
-        records, token = self.fetch_page(url, token=None)
+        token = self.resume_token()
+        resuming = token is not None
 
         while True:
-            for record in records:
-                yield (
-                    record.xpath('ns0:header/ns0:identifier', namespaces=self.namespaces)[0].text,
-                    etree.tostring(record),
-                )
+            # Resuming from this cursor will re-fetch the page about to be yielded
+            self.cursor = {'token': token, 'expires': self.token_expires} if token else None
+
+            try:
+                if self.streaming:
+                    count, token = yield from self.stream_page(url, token=token)
+                else:
+                    records, token = self.fetch_page(url, token=token)
+                    count = len(records)
+                    for record in records:
+                        yield (
+                            record.xpath('ns0:header/ns0:identifier', namespaces=self.namespaces)[0].text,
+                            etree.tostring(record),
+                        )
+            except OAIError as e:
+                if not (resuming and e.code == 'badResumptionToken'):
+                    raise
+                logger.warning('Unable to resume %s from token %s, it is no longer valid. Restarting from the first page', self.config.label, token)
+                token = self.token_expires = None
+                continue
+            finally:
+                resuming = False
+
+            if not token or not count:
+                break
 
-            records, token = self.fetch_page(url, token=token)
+    def resume_token(self) -> str:
+        if not self.cursor or not self.cursor.get('token'):
+            return None
 
-            if not token or not records:
-                break
+        self.token_expires = self.cursor.get('expires')
+        if self.token_expires and arrow.get(self.token_expires) < arrow.utcnow():
+            logger.warning('Resumption token for %s expired at %s, restarting from the first page', self.config.label, self.token_expires)
+            self.token_expires = None
+            return None
+
+        return self.cursor['token']
 
     def fetch_page(self, url: furl, token: str=None) -> (list, str):
-        if token:
-            url.remove('from')
-            url.remove('until')
-            url.remove('metadataPrefix')
-            url.args['resumptionToken'] = token
+        url = self.page_url(url, token)
 
         logger.info('Making request to {}'.format(url.url))
 
         resp = self.requests.get(url.url)
-        parsed = etree.fromstring(resp.content)
+        resp.raise_for_status()
+        parsed = etree.fromstring(resp.content, parser=etree.XMLParser(resolve_entities=False, no_network=True))
+
+        for error in parsed.xpath('//ns0:error', namespaces=self.namespaces):
+            self.handle_error(error)
 
         records = parsed.xpath('//ns0:record', namespaces=self.namespaces)
-        token = (parsed.xpath('//ns0:resumptionToken/node()', namespaces=self.namespaces) + [None])[0]
+        token = (parsed.xpath('//ns0:resumptionToken', namespaces=self.namespaces) + [None])[0]
+        self.token_expires = token.get('expirationDate') if token is not None else None
+        token = token.text if token is not None else None
 
         logger.info('Found {} records. Continuing with token {}'.format(len(records), token))
 
         return records, token
+
+    def stream_page(self, url: furl, token: str=None) -> Iterator[Tuple[str, bytes]]:
+        """Incrementally parse a page of records, yielding each record as soon as it has been parsed.
+
+        Records are freed as soon as they are serialized so memory use does not grow with the page size.
+
+        Returns:
+            (int, str): The number of records found and the resumption token for the next page,
+            via StopIteration. Use `count, token = yield from self.stream_page(url)`.
+        """
+        url = self.page_url(url, token)
+
+        logger.info('Making request to {}'.format(url.url))
+
+        count, token, pending = 0, None, None
+        parser = etree.XMLPullParser(events=('end', ), tag=(self.RECORD_TAG, self.TOKEN_TAG, self.ERROR_TAG), resolve_entities=False, no_network=True)
+        resp = self.requests.get(url.url, stream=True)
+
+        try:
+            resp.raise_for_status()
+            for chunk in itertools.chain(resp.iter_content(chunk_size=self.chunk_size), [None]):
+                if chunk is None:
+                    parser.close()
+                else:
+                    parser.feed(chunk)
+
+                for _, element in parser.read_events():
+                    # A record's tail is not parsed until the following element is.
+                    # Wait until then to serialize it so the output is identical to fetch_page's.
+                    if pending is not None:
+                        count += 1
+                        yield self.pop_record(pending)
+                        pending = None
+
+                    if element.tag == self.ERROR_TAG:
+                        self.handle_error(element)
+                    elif element.tag == self.TOKEN_TAG:
+                        token = element.text
+                        self.token_expires = element.get('expirationDate')
+                    else:
+                        pending = element
+
+            if pending is not None:
+                count += 1
+                yield self.pop_record(pending)
+        finally:
+            resp.close()
+
+        if token is None:
+            self.token_expires = None
+
+        logger.info('Found {} records. Continuing with token {}'.format(count, token))
+
+        return count, token
+
+    def pop_record(self, element: etree.Element) -> Tuple[str, bytes]:
+        identifier = element.xpath('ns0:header/ns0:identifier', namespaces=self.namespaces)[0].text
+        record = etree.tostring(element)
+
+        # Free the parsed record and any preceding siblings, the rest of the tree is never looked at again
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+        return identifier, record
+
+    def handle_error(self, element: etree.Element) -> None:
+        # noRecordsMatch just indicates an empty result set
+        if element.get('code') == 'noRecordsMatch':
+            return
+        raise OAIError(element.get('code'), element.text)
+
+    def page_url(self, url: furl, token: str=None) -> furl:
+        if not token:
+            return url
+
+        url = url.copy()
+        url.remove('from')
+        url.remove('until')
+        url.remove('metadataPrefix')
+        url.args['resumptionToken'] = token
+        return url
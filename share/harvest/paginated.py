@@ -0,0 +1,103 @@
+import abc
+import logging
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+from typing import Union
+from typing import Iterator
+
+import arrow
+
+from share.harvest.harvester import Harvester
+
+logger = logging.getLogger(__name__)
+
+
+class PaginatedHarvester(Harvester, metaclass=abc.ABCMeta):
+    """A harvester for APIs where the URL of every page is known once the first page has been fetched,
+    IE offset or page number based pagination with a total count in the response.
+
+    After the first page, up to `concurrency` pages are requested at once by a thread pool
+    sharing this harvester's session, so rate limits and keep-alive connections still apply.
+    Records are yielded in page order, and at most `concurrency` pages are held in memory at a time.
+
+    The harvester's cursor is the index of the page currently being yielded.
+    """
+
+    concurrency = 4  # Maximum number of pages to request at once
+
+    def __init__(self, app_config):
+        super().__init__(app_config)
+        self.concurrency = getattr(self.config, 'concurrency', self.concurrency)
+        self.pool_size = max(self.pool_size, self.concurrency)
+
+    @abc.abstractmethod
+    def first_page(self, start_date: arrow.Arrow, end_date: arrow.Arrow) -> str:
+        """Returns:
+            str: The URL of the first page of results in the given date range
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def page_urls(self, url: str, page: dict) -> list:
+        """Args:
+            url (str): The URL of the first page
+            page (dict): The parsed first page
+
+        Returns:
+            list<str>: The URLs of all the remaining pages, in order
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_records(self, page: dict) -> Iterator[Tuple[str, Union[str, dict, bytes]]]:
+        """Returns:
+            Iterator<Tuple<str, str|dict|bytes>>: The records found in the given page paired with their unique IDs
+        """
+        raise NotImplementedError
+
+    def fetch_page(self, url: str) -> dict:
+        logger.debug('Making request to %s', url)
+        resp = self.requests.get(url)
+        resp.raise_for_status()
+        return resp.json()
+
+    def do_harvest(self, start_date: arrow.Arrow, end_date: arrow.Arrow) -> Iterator[Tuple[str, Union[str, dict, bytes]]]:
+        resume_from = self.cursor or 0
+        url = self.first_page(start_date, end_date)
+        first = self.fetch_page(url)
+
+        if resume_from == 0:
+            self.cursor = 0
+            yield from self.get_records(first)
+
+        urls = self.page_urls(url, first)
+        logger.info('Found %d more pages for %s, fetching %d at a time', len(urls), self.config.label, self.concurrency)
+
+        for index, page in enumerate(self.fetch_pages(urls[max(resume_from - 1, 0):]), max(resume_from, 1)):
+            self.cursor = index
+            yield from self.get_records(page)
+
+    def fetch_pages(self, urls: list) -> Iterator[dict]:
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        urls, pending = iter(urls), deque()
+
+        try:
+            for url in itertools.islice(urls, self.concurrency):
+                pending.append(executor.submit(self.fetch_page, url))
+
+            while pending:
+                page = pending.popleft().result()
+
+                # Keep the window full while the caller processes this page
+                for url in itertools.islice(urls, 1):
+                    pending.append(executor.submit(self.fetch_page, url))
+
+                yield page
+        finally:
+            # If the caller stopped early, requests that have not started are never made
+            # and those in flight are waited for, so none outlive the harvest
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
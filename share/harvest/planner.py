@@ -0,0 +1,154 @@
+import logging
+import datetime
+
+import arrow
+
+from django.db import transaction
+
+from share.models import CeleryProviderTask
+from share.models import HarvestPlan
+
+logger = logging.getLogger(__name__)
+
+
+class HarvestPlanner:
+    """Splits a large date range into smaller windows that may be harvested in parallel.
+
+    The windows of a plan are stored as a HarvestPlan and dispatched as separate HarvesterTasks.
+    `concurrency` windows are dispatched up front, then the next window is dispatched as each one finishes,
+    whether it succeeded or not, so at most `concurrency` windows of a provider are being harvested at once
+    and a failed window never holds up the rest of the plan.
+    Each task records its plan and window in its checkpoint so the progress of the run as a whole may be reported.
+    """
+
+    INTERVALS = {
+        'hour': datetime.timedelta(hours=1),
+        'day': datetime.timedelta(days=1),
+        'week': datetime.timedelta(weeks=1),
+    }
+
+    concurrency = 2  # Maximum number of windows of a single provider to harvest at once
+    target_size = 5000  # Number of documents to aim for per window when sizing windows adaptively
+    min_interval = datetime.timedelta(hours=1)
+    max_interval = datetime.timedelta(days=30)
+    history = 50  # Number of previous harvests to look at when sizing windows adaptively
+
+    def __init__(self, config, interval='day', concurrency=None):
+        assert interval == 'auto' or interval in self.INTERVALS, 'interval must be one of {}, found {}'.format(('auto', ) + tuple(self.INTERVALS), interval)
+        self.config = config
+        self.interval = interval
+        self.concurrency = concurrency or getattr(self.config, 'harvest_concurrency', self.concurrency)
+
+    def plan(self, start: arrow.Arrow, end: arrow.Arrow) -> list:
+        start, end = arrow.get(start), arrow.get(end)
+        assert start < end, 'start must be before end {} < {}'.format(start, end)
+
+        step = self.estimate_interval() if self.interval == 'auto' else self.INTERVALS[self.interval]
+
+        windows = []
+        while start < end:
+            windows.append((start, min(start + step, end)))
+            start += step
+
+        logger.info('Planned %d windows of %s for %s', len(windows), step, self.config.label)
+        return windows
+
+    def estimate_interval(self) -> datetime.timedelta:
+        """Size windows so that each one is expected to hold about target_size documents,
+        based on the number of documents found by previous successful harvests of this provider.
+
+        Every harvest records the range it covered, see HarvesterTask, including those that found nothing.
+        """
+        documents, seconds = 0, 0
+        for checkpoint in CeleryProviderTask.objects.filter(
+            name='share.tasks.HarvesterTask',
+            app_label=self.config.label,
+            status=CeleryProviderTask.STATUS.succeeded,
+            checkpoint__has_key='range',
+        ).values_list('checkpoint', flat=True)[:self.history]:
+            try:
+                seconds += (arrow.get(checkpoint['range']['end']) - arrow.get(checkpoint['range']['start'])).total_seconds()
+            except (arrow.parser.ParserError, KeyError, TypeError):
+                continue
+            documents += checkpoint.get('count', 0)
+
+        if not documents or seconds <= 0:
+            logger.warning('No harvest history found for %s, falling back to daily windows', self.config.label)
+            return self.INTERVALS['day']
+
+        interval = datetime.timedelta(seconds=self.target_size * seconds / documents)
+        # Round down to whole hours to keep windows aligned
+        interval = datetime.timedelta(hours=interval // datetime.timedelta(hours=1))
+
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def dispatch(self, started_by, windows: list, **kwargs) -> str:
+        plan = HarvestPlan.objects.create(
+            app_label=self.config.label,
+            started_by=started_by,
+            windows=[[start.isoformat(), end.isoformat()] for start, end in windows],
+            kwargs=kwargs,
+        )
+
+        for _ in range(min(self.concurrency, len(windows))):
+            self.advance(plan.id)
+
+        logger.info('Dispatched plan %s of %d windows, %d at a time, for %s', plan.id, len(windows), self.concurrency, self.config.label)
+        return str(plan.id)
+
+    @classmethod
+    def advance(cls, plan_id: str) -> int:
+        """Dispatch the next window of a plan, if any remain.
+
+        Called by the HarvesterTask of every window once it has finished, successfully or not.
+
+        Returns:
+            int: The index of the dispatched window, or None if every window has been dispatched
+        """
+        from share.tasks import HarvesterTask
+
+        with transaction.atomic():
+            plan = HarvestPlan.objects.select_for_update().get(id=plan_id)
+            if plan.dispatched >= len(plan.windows):
+                return None
+            window = plan.dispatched
+            plan.dispatched += 1
+            plan.save(update_fields=['dispatched'])
+
+        start, end = plan.windows[window]
+        HarvesterTask().apply_async((plan.app_label, plan.started_by_id), {**plan.kwargs, 'start': start, 'end': end, 'plan': {'id': str(plan.id), 'window': window}})
+        logger.debug('Dispatched window %d of %d, %s - %s, of plan %s', window + 1, len(plan.windows), start, end, plan.id)
+
+        return window
+
+    @classmethod
+    def progress(cls, plan_id: str) -> dict:
+        """
+        Returns:
+            dict: The number of windows in the plan, how many of them have yet to be dispatched (pending),
+            have been dispatched but not yet started (queued) and have been started, retried, failed or succeeded,
+            the [start, end] of each failed window and the number of documents harvested so far
+        """
+        plan = HarvestPlan.objects.get(id=plan_id)
+        # Keyed by identifier rather than display name, which is translated
+        statuses = {value: identifier for identifier, value in CeleryProviderTask.STATUS._identifier_map.items()}
+        progress = {
+            'windows': len(plan.windows),
+            'pending': len(plan.windows) - plan.dispatched,
+            'queued': plan.dispatched,
+            'documents': 0,
+            'failures': [],
+            **{status: 0 for status in statuses.values()},
+        }
+
+        for status, checkpoint in CeleryProviderTask.objects.filter(
+            name='share.tasks.HarvesterTask',
+            checkpoint__contains={'plan': {'id': str(plan.id)}},
+        ).values_list('status', 'checkpoint'):
+            progress['queued'] -= 1
+            progress[statuses[status]] += 1
+            progress['documents'] += checkpoint.get('count', 0)
+            if status == CeleryProviderTask.STATUS.failed:
+                progress['failures'].append(plan.windows[checkpoint['plan']['window']])
+
+        return progress
@@ -0,0 +1,134 @@
+import abc
+import os
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+from typing import Tuple
+from typing import Callable
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(metaclass=abc.ABCMeta):
+    """A token bucket shared by every harvester of a single provider.
+
+    The bucket holds at most `calls` tokens and refills at `calls / period` tokens per second.
+    Acquiring a token when the bucket is empty reserves a future token, putting the bucket into debt,
+    and sleeps until that token would have been available. Reservations are made atomically so concurrent
+    callers queue up behind each other rather than all waking at once.
+    """
+
+    def __init__(self, key: str, calls: int, period: float):
+        assert calls > 0 and period > 0, 'Rate limits must be positive, got {} calls per {} seconds'.format(calls, period)
+        self.key = key
+        self.calls = calls
+        self.period = period
+
+    @property
+    def rate(self) -> float:
+        return self.calls / self.period
+
+    def acquire(self) -> float:
+        """Take a single token from the bucket, blocking until it is available.
+
+        Returns:
+            float: The number of seconds spent waiting
+        """
+        wait = self.reserve()
+        if wait > 0:
+            logger.debug('Rate limit for %s reached, sleeping %.3f seconds', self.key, wait)
+            time.sleep(wait)
+        return max(wait, 0)
+
+    def reserve(self) -> float:
+        """Atomically take a token and return the number of seconds until it may be used.
+        """
+        def take(tokens):
+            tokens -= 1
+            return tokens, max(-tokens / self.rate, 0)
+        return self._update(take)
+
+    def throttle(self, seconds: float) -> None:
+        """Withhold all tokens for the next `seconds`, IE when the provider has asked us to back off.
+        """
+        def withhold(tokens):
+            # The next token taken will have to wait `seconds` before being used
+            return min(tokens, 1 - seconds * self.rate), None
+        self._update(withhold)
+
+    @abc.abstractmethod
+    def _update(self, func: Callable[[float], Tuple[float, object]]) -> object:
+        """Atomically refill the bucket and replace its token count with the first value returned by func.
+
+        Returns:
+            The second value returned by func
+        """
+        raise NotImplementedError
+
+    def _refill(self, tokens: float, last: float, now: float) -> float:
+        return min(self.calls, tokens + (now - last) * self.rate)
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Token bucket shared between all harvesters and threads inside a single process.
+    """
+
+    _lock = threading.Lock()
+    _buckets = {}
+
+    def _update(self, func):
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(self.key, (self.calls, now))
+            tokens, result = func(self._refill(tokens, last, now))
+            self._buckets[self.key] = (tokens, now)
+        return result
+
+
+class FileRateLimiter(RateLimiter):
+    """Token bucket shared between all processes on a single machine.
+
+    Bucket state is kept in a small file per provider, guarded by an exclusive flock.
+    The directory may be configured via settings.HARVESTER_RATE_LIMIT_DIR.
+    """
+
+    def __init__(self, key, calls, period, directory=None):
+        super().__init__(key, calls, period)
+        self.directory = directory or getattr(settings, 'HARVESTER_RATE_LIMIT_DIR', None) or os.path.join(tempfile.gettempdir(), 'share-ratelimits')
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, '{}.bucket'.format(self.key))
+
+    def _update(self, func):
+        with open(self.path, 'a+') as fobj:
+            fcntl.flock(fobj, fcntl.LOCK_EX)
+            try:
+                fobj.seek(0)
+                now = time.time()
+                try:
+                    tokens, last = (float(x) for x in fobj.read().split())
+                except ValueError:
+                    tokens, last = self.calls, now  # Empty or corrupt file, start with a full bucket
+
+                tokens, result = func(self._refill(tokens, last, now))
+
+                fobj.seek(0)
+                fobj.truncate()
+                fobj.write('{!r} {!r}'.format(tokens, now))
+                fobj.flush()
+            finally:
+                fcntl.flock(fobj, fcntl.LOCK_UN)
+        return result
+
+
+def get_rate_limiter(key: str, rate_limit: (int, float)) -> RateLimiter:
+    """Build the rate limiter configured by settings.HARVESTER_RATE_LIMITER for the given provider.
+    """
+    klass = getattr(settings, 'HARVESTER_RATE_LIMITER', 'share.harvest.ratelimit.MemoryRateLimiter')
+    if isinstance(klass, str):
+        klass = import_string(klass)
+    return klass(key, *rate_limit)
@@ -0,0 +1,102 @@
+import time
+import random
+import logging
+import datetime
+import itertools
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class HarvesterSession(requests.Session):
+    """A requests.Session tuned for harvesting a single provider.
+
+    Connections are pooled and kept alive between requests, compressed responses are negotiated,
+    every request is given a default timeout and passes through the provider's rate limiter,
+    and connection level failures are retried with a backoff by urllib3.
+
+    If an enabled HTTPCache is given, responses are recorded to or replayed from it.
+    Replayed responses are not subject to rate limiting.
+
+    Throttling responses, 429 and 503, are retried after honoring their Retry-After header or an exponential backoff with jitter.
+    While backing off, the provider's shared rate limiter is throttled so every other harvester of the provider backs off as well.
+    """
+
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, rate_limiter=None, timeout=None, retries=0, pool_size=10, backoff_retries=5, backoff_factor=2, max_backoff=300, cache=None):
+        super().__init__()
+        self.cache = cache if cache and cache.enabled else None
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.backoff_retries = backoff_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, connect=retries, read=retries, backoff_factor=0.5, raise_on_redirect=False),
+        )
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in itertools.count():
+            resp = super().request(method, url, **kwargs)
+            if resp.status_code not in self.THROTTLE_STATUSES:
+                return resp
+
+            wait = self.backoff(resp, attempt)
+            resp.close()
+
+            if attempt >= self.backoff_retries or wait > self.max_backoff:
+                logger.error('Throttled by %s %d times, giving up. Asked to wait %.1f seconds', url, attempt + 1, wait)
+                self.pause(min(wait, self.max_backoff))
+                resp.raise_for_status()
+
+            logger.warning('Throttled by %s (%d), backing off for %.1f seconds', url, resp.status_code, wait)
+            self.pause(wait)
+
+    def send(self, request, **kwargs):
+        if self.cache and self.cache.mode == 'replay':
+            return self.cache.get(request)
+
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+        resp = super().send(request, **kwargs)
+
+        if self.cache and self.cache.mode == 'record' and resp.status_code not in self.THROTTLE_STATUSES:
+            self.cache.put(request, resp)
+
+        return resp
+
+    def backoff(self, resp, attempt) -> float:
+        retry_after = resp.headers.get('Retry-After')
+
+        if retry_after:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                pass
+            try:
+                return max((parsedate_to_datetime(retry_after) - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0)
+            except (TypeError, ValueError):
+                logger.warning('Unable to parse Retry-After header %r', retry_after)
+
+        return self.backoff_factor * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def pause(self, seconds) -> None:
+        if self.rate_limiter:
+            self.rate_limiter.throttle(seconds)
+        else:
+            time.sleep(seconds)
@@ -7,6 +7,7 @@ from django.conf import settings
 
 from share.models import ShareUser
 from share.tasks import HarvesterTask
+from share.harvest.planner import HarvestPlanner
 from share.provider import ProviderAppConfig
 
 
@@ -20,11 +21,24 @@ class Command(BaseCommand):
         parser.add_argument('--days-back', type=int, help='The number of days to go back, defaults to 1')
         parser.add_argument('--start', type=str, help='The day to start harvesting, in the format YYYY-MM-DD')
         parser.add_argument('--end', type=str, help='The day to end harvesting, in the format YYYY-MM-DD')
+        parser.add_argument('--restart', action='store_true', help='Harvest the entire date range rather than resuming a previously failed harvest of it')
+        parser.add_argument('--renormalize', action='store_true', help='Normalize exact copies of previously harvested documents again')
+
+        parser.add_argument('--interval', type=str, choices=('auto', ) + tuple(HarvestPlanner.INTERVALS), help='Split the date range into windows of this size and harvest them separately. auto sizes windows based on previous harvests')
+        parser.add_argument('--concurrency', type=int, help='The maximum number of windows to harvest at once when using --interval and --async')
+        parser.add_argument('--progress', type=str, metavar='PLAN_ID', help='Report the progress of a previously dispatched plan')
 
     def handle(self, *args, **options):
         user = ShareUser.objects.get(username=settings.APPLICATION_USERNAME)
 
-        task_kwargs = {}
+        if options['progress']:
+            progress = HarvestPlanner.progress(options['progress'])
+            self.stdout.write('{windows} windows: {pending} pending, {queued} queued, {started} started, {retried} retried, {failed} failed, {succeeded} succeeded. {documents} documents harvested'.format(**progress))
+            for start, end in progress['failures']:
+                self.stdout.write('Failed to harvest {} - {}'.format(start, end))
+            return
+
+        task_kwargs = {'resume': not options['restart'], 'renormalize': options['renormalize']}
 
         if options['days_back'] is not None and (options['start'] or options['end']):
             self.stdout.write('Please choose days-back OR a start date with end date, not both')
@@ -37,6 +51,7 @@ class Command(BaseCommand):
             task_kwargs['start'] = arrow.get(options['start']) if options.get('start') else arrow.utcnow() - datetime.timedelta(days=int(options['days_back'] or 1))
             task_kwargs['end'] = arrow.get(options['end']) if options.get('end') else arrow.utcnow()
 
+        start, end = task_kwargs['start'], task_kwargs['end']
         task_kwargs['end'] = task_kwargs['end'].isoformat() + 'Z'
         task_kwargs['start'] = task_kwargs['start'].isoformat() + 'Z'
 
@@ -47,9 +62,29 @@ class Command(BaseCommand):
             apps.get_app_config(harvester)  # Die if the AppConfig can not be loaded
 
             task_args = (harvester, user.id,)
-            if options['async']:
+            if options['interval']:
+                self.run_plan(harvester, user, start, end, options)
+            elif options['async']:
                 HarvesterTask().apply_async(task_args, task_kwargs)
                 self.stdout.write('Started job for harvester {}'.format(harvester))
             else:
                 self.stdout.write('Running harvester for {}'.format(harvester))
                 HarvesterTask().apply(task_args, task_kwargs, throw=True)
+
+    def run_plan(self, harvester, user, start, end, options):
+        planner = HarvestPlanner(apps.get_app_config(harvester), interval=options['interval'], concurrency=options['concurrency'])
+        windows = planner.plan(start, end)
+
+        if options['async']:
+            plan_id = planner.dispatch(user, windows, resume=not options['restart'], renormalize=options['renormalize'])
+            self.stdout.write('Started plan {} of {} windows for harvester {}. Check on it with --progress {}'.format(plan_id, len(windows), harvester, plan_id))
+            return
+
+        for i, (window_start, window_end) in enumerate(windows):
+            self.stdout.write('Running harvester for {} {} - {} ({}/{})'.format(harvester, window_start, window_end, i + 1, len(windows)))
+            HarvesterTask().apply((harvester, user.id), {
+                'start': window_start.isoformat(),
+                'end': window_end.isoformat(),
+                'resume': not options['restart'],
+                'renormalize': options['renormalize'],
+            }, throw=True)
@@ -4,6 +4,7 @@ from django.conf import settings
 
 from share.models import ShareUser, RawData
 from share.tasks import NormalizerTask
+from share.normalize.bulk import BulkNormalizer
 
 
 class Command(BaseCommand):
@@ -13,18 +14,44 @@ class Command(BaseCommand):
         parser.add_argument('raws', nargs='*', type=int, help='The id(s) of the raw record to normalize')
         parser.add_argument('--all', action='store_true', help='Normalize all data for the provider specified')
         parser.add_argument('--async', action='store_true', help='Whether or not to use Celery')
+        parser.add_argument('--force', action='store_true', help='Normalize raw records even if this version of the normalizer has already processed them')
+
+        parser.add_argument('--bulk', action='store_true', help='Normalize in a local pool of processes, streaming raw records from the database and storing the results in batches')
+        parser.add_argument('--workers', type=int, help='The number of processes to use with --bulk, defaults to the number of CPUs. 0 normalizes in this process')
+        parser.add_argument('--batch-size', type=int, default=100, help='The number of raw records each process normalizes and stores at once with --bulk')
 
     def handle(self, *args, **options):
         user = ShareUser.objects.get(username=settings.APPLICATION_USERNAME)
         config = apps.get_app_config(options['normalizer'])
 
+        if options['bulk']:
+            return self.bulk(config, options)
+
         if not options['raws'] and options['all']:
             options['raws'] = RawData.objects.filter(app_label=config.label).values_list('id', flat=True)
 
         for raw in options['raws']:
             task_args = (config.label, user.id, raw,)
+            task_kwargs = {'force': options['force']}
 
             if options['async']:
-                NormalizerTask().apply_async(task_args)
+                NormalizerTask().apply_async(task_args, task_kwargs)
             else:
-                NormalizerTask().apply(task_args, throw=True)
+                NormalizerTask().apply(task_args, task_kwargs, throw=True)
+
+    def bulk(self, config, options):
+        if not options['raws'] and not options['all']:
+            self.stdout.write('Please specify the raw records to normalize or --all')
+            return
+
+        queryset = RawData.objects.filter(app_label=config.label)
+        if options['raws']:
+            queryset = queryset.filter(id__in=options['raws'])
+
+        normalizer = BulkNormalizer(config, workers=options['workers'], batch_size=options['batch_size'], force=options['force'])
+        progress = normalizer.run(queryset, on_progress=lambda progress: self.stdout.write(
+            '{processed} normalized in {elapsed:.0f}s, {rate:.1f}/s. {succeeded} stored, {unchanged} unchanged, {empty} empty, {failed} failed'.format(**progress)
+        ))
+
+        for raw_id, error in sorted(progress['errors'].items()):
+            self.stdout.write('Failed to normalize {}: {}'.format(raw_id, error))
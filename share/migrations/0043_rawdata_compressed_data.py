@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share', '0042_celerytask_checkpoint'),
+    ]
+
+    # Originally switched data to a text based CompressedTextField, which left the column as it was.
+    # The column is converted to bytea by 0046_rawdata_data_bytea
+    operations = [
+    ]
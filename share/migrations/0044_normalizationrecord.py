@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share', '0043_rawdata_compressed_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NormalizationRecord',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('sha256', models.TextField(validators=[django.core.validators.MaxLengthValidator(64)])),
+                ('app_label', models.TextField()),
+                ('app_version', models.TextField()),
+                ('graph_sha256', models.TextField(null=True, validators=[django.core.validators.MaxLengthValidator(64)])),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='normalizationrecord',
+            unique_together=set([('sha256', 'app_label', 'app_version')]),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share', '0044_normalizationrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HarvestPlan',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('app_label', models.TextField()),
+                ('windows', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('kwargs', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('dispatched', models.IntegerField(default=0)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('started_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
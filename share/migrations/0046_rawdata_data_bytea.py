@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import share.models.fields
+
+
+def uncompress_data(apps, schema_editor):
+    # Postgres can not decompress rows itself, rewrite compressed rows as UNCOMPRESSED so they may be converted back to text
+    field = share.models.fields.CompressedTextField()
+    connection = schema_editor.connection
+    last = 0
+
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute('SELECT id, data FROM share_rawdata WHERE id > %s AND get_byte(data, 0) <> 0 ORDER BY id LIMIT 1000', [last])
+            rows = cursor.fetchall()
+            if not rows:
+                return
+
+            for pk, data in rows:
+                cursor.execute('UPDATE share_rawdata SET data = %s WHERE id = %s', [
+                    connection.Database.Binary(field.UNCOMPRESSED + field.decompress(data).encode('utf-8')),
+                    pk
+                ])
+            last = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    """Converts share_rawdata.data to bytea, see CompressedTextField.
+
+    Existing rows are stored as is, behind CompressedTextField.UNCOMPRESSED. Only rows written from now on are compressed.
+
+    Converting the column rewrites all of share_rawdata, the largest table, under an ACCESS EXCLUSIVE lock.
+    Nothing may read or write RawData until it finishes, so stop harvesters, normalizers and the API before migrating.
+    Expect it to take about as long as copying the table. Reversing it takes longer, as every compressed row
+    must be decompressed in Python first.
+    """
+
+    dependencies = [
+        ('share', '0045_harvestplan'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        "ALTER TABLE share_rawdata ALTER COLUMN data TYPE bytea USING decode('00', 'hex') || convert_to(data, 'UTF8')",
+                        # The field compresses values itself, Postgres should not try to again
+                        'ALTER TABLE share_rawdata ALTER COLUMN data SET STORAGE EXTERNAL',
+                    ],
+                    reverse_sql=[
+                        'ALTER TABLE share_rawdata ALTER COLUMN data SET STORAGE EXTENDED',
+                        "ALTER TABLE share_rawdata ALTER COLUMN data TYPE text USING convert_from(substring(data FROM 2), 'UTF8')",
+                    ],
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='rawdata',
+                    name='data',
+                    field=share.models.fields.CompressedTextField(),
+                ),
+            ],
+        ),
+        # Only does anything when reversed, before the column is converted back to text
+        migrations.RunPython(migrations.RunPython.noop, uncompress_data),
+    ]
@@ -1,6 +1,9 @@
+import uuid
+
 from fuzzycount import FuzzyCountManager
 from model_utils import Choices
 
+from django.contrib.postgres.fields import JSONField
 from django.db import models
 from django.utils.translation import ugettext as _
 from typedmodels.models import TypedModel
@@ -35,3 +38,22 @@ class CeleryProviderTask(CeleryTask):
     app_version = models.TextField(blank=True, db_index=True)
     provider = models.ForeignKey(ShareUser, related_name='provider')
     started_by = models.ForeignKey(ShareUser, related_name='started_by')
+    # How far this task has gotten, used to resume after a retry
+    checkpoint = JSONField(null=True, blank=True)
+
+
+class HarvestPlan(models.Model):
+    """A date range split into windows to be harvested separately, see share.harvest.planner.
+
+    Windows are dispatched in order, as earlier windows finish. dispatched is the number that have been so far.
+    The HarvesterTask of each window records the plan's id and the window's index in its checkpoint.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    app_label = models.TextField()
+    started_by = models.ForeignKey(ShareUser, related_name='+')
+    # [[start, end], ...] in ISO 8601
+    windows = JSONField()
+    # Passed on to the HarvesterTask of every window
+    kwargs = JSONField(default=dict)
+    dispatched = models.IntegerField(default=0)
+    date_created = models.DateTimeField(auto_now_add=True)
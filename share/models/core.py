@@ -1,13 +1,17 @@
 import datetime
+import json
 import logging
 import random
+import re
 import string
 from hashlib import sha256
+from collections import OrderedDict
 
 from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin, Group
 from django.core import validators
+from django.db import connections, router
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -17,11 +21,11 @@ from fuzzycount import FuzzyCountManager
 from oauth2_provider.models import AccessToken, Application
 
 from osf_oauth2_adapter.apps import OsfOauth2AdapterConfig
-from share.models.fields import DateTimeAwareJSONField, ShareURLField
+from share.models.fields import CompressedTextField, DateTimeAwareJSONField, ShareURLField
 from share.models.validators import JSONLDValidator
 
 logger = logging.getLogger(__name__)
-__all__ = ('ShareUser', 'RawData', 'NormalizedData',)
+__all__ = ('ShareUser', 'RawData', 'NormalizedData', 'NormalizationRecord',)
 
 
 class ShareUserManager(BaseUserManager):
@@ -187,6 +191,89 @@ class RawDataManager(FuzzyCountManager):
         rd.save()  # Force timestamps to update
         return rd
 
+    def find_stored(self, keys, source):
+        """Find which documents have already been stored, using a single query.
+
+        Args:
+            keys: An iterable of (doc_id, sha256) tuples
+            source (ShareUser):
+
+        Returns:
+            dict<(str, str), int>: The ids of the stored RawData, keyed by (doc_id, sha256).
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+
+        stored = self.filter(
+            source=source,
+            provider_doc_id__in={doc_id for doc_id, _ in keys},
+            sha256__in={digest for _, digest in keys},
+        ).values_list('provider_doc_id', 'sha256', 'id')
+
+        return {(doc_id, digest): pk for doc_id, digest, pk in stored if (doc_id, digest) in keys}
+
+    def bulk_store_data(self, data, source, app_label):
+        """Store a batch of documents using a single INSERT ... ON CONFLICT statement.
+
+        Exact copies of previously stored documents only have their date_seen updated.
+
+        Args:
+            data: An iterable of (doc_id, bytes) tuples
+            source (ShareUser):
+            app_label (str):
+
+        Returns:
+            list<(RawData, bool)>: The stored RawData and whether it was newly created, in the order given.
+        """
+        connection = connections[router.db_for_write(self.model)]
+        data_field = self.model._meta.get_field('data')
+
+        # A row may only be upserted once per statement, duplicates within the batch share a result
+        keys, rows = [], OrderedDict()
+        for doc_id, datum in data:
+            key = (doc_id, sha256(datum).hexdigest())
+            keys.append(key)
+            rows.setdefault(key, datum)
+
+        if not rows:
+            return []
+
+        now = timezone.now()
+        params = []
+        for (doc_id, digest), datum in rows.items():
+            params.extend((source.id, app_label, doc_id, data_field.get_db_prep_save(datum, connection), digest, now, now))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} (source_id, app_label, provider_doc_id, data, sha256, date_seen, date_harvested) '
+                'VALUES {values} '
+                'ON CONFLICT (provider_doc_id, source_id, sha256) DO UPDATE SET date_seen = EXCLUDED.date_seen '
+                'RETURNING id, provider_doc_id, sha256, date_harvested, (xmax = 0) AS created'.format(
+                    table=self.model._meta.db_table,
+                    values=', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows)),
+                ),
+                params
+            )
+
+            results = {}
+            for pk, doc_id, digest, date_harvested, created in cursor.fetchall():
+                results[doc_id, digest] = (self.model(
+                    id=pk,
+                    source=source,
+                    app_label=app_label,
+                    provider_doc_id=doc_id,
+                    data=rows[doc_id, digest],
+                    sha256=digest,
+                    date_seen=now,
+                    date_harvested=date_harvested,
+                ), created)
+
+        created = sum(1 for _, was_created in results.values() if was_created)
+        logger.debug('Stored %d new documents and %d exact copies from %s', created, len(keys) - created, source)
+
+        return [results[key] for key in keys]
+
 
 class RawData(models.Model):
     id = models.AutoField(primary_key=True)
@@ -195,7 +282,8 @@ class RawData(models.Model):
     app_label = models.TextField(db_index=True)
     provider_doc_id = models.TextField()
 
-    data = models.TextField()
+    # Stored compressed, sha256 is always of the original, uncompressed data
+    data = CompressedTextField()
     sha256 = models.TextField(validators=[validators.MaxLengthValidator(64)])
 
     date_seen = models.DateTimeField(auto_now=True)
@@ -231,3 +319,121 @@ class NormalizedData(models.Model):
 
     def __str__(self):
         return '{} created at {}'.format(self.source.get_short_name(), self.created_at)
+
+
+class NormalizationRecordManager(models.Manager):
+
+    def find_normalized(self, digests, app_label, app_version):
+        """Find which documents a version of a normalizer has already processed, using a single query.
+
+        Args:
+            digests: An iterable of RawData sha256s
+            app_label (str):
+            app_version (str):
+
+        Returns:
+            set<str>: The sha256s of the documents that have been processed.
+        """
+        return set(self.filter(
+            app_label=app_label,
+            app_version=app_version,
+            sha256__in=set(digests),
+        ).values_list('sha256', flat=True))
+
+    def find_latest_graphs(self, digests, app_label):
+        """Find the graph most recently recorded for each document by any version of a normalizer, using a single query.
+
+        Only the latest graph is current, earlier versions may have produced graphs that have since been replaced.
+
+        Args:
+            digests: An iterable of RawData sha256s
+            app_label (str):
+
+        Returns:
+            dict<str, str>: sha256 to graph_sha256. Empty graphs are not included, as they are never submitted.
+        """
+        return dict(self.filter(
+            app_label=app_label,
+            sha256__in=set(digests),
+            graph_sha256__isnull=False,
+        ).order_by('sha256', '-date_created', '-id').distinct('sha256').values_list('sha256', 'graph_sha256'))
+
+    def forget(self, digest, app_label, graph_digest):
+        """Remove the records of a graph that failed to be applied, so its document will be normalized again.
+
+        Args:
+            digest (str): The RawData's sha256
+            app_label (str):
+            graph_digest (str):
+        """
+        self.filter(sha256=digest, app_label=app_label, graph_sha256=graph_digest).delete()
+
+    def record(self, records, app_label, app_version):
+        """Record the graphs a version of a normalizer produced, replacing any previous records of the same documents.
+
+        Uses a single INSERT ... ON CONFLICT statement, so documents recorded concurrently never conflict.
+
+        Args:
+            records: An iterable of (sha256, graph_sha256) tuples. graph_sha256 is None for empty graphs
+            app_label (str):
+            app_version (str):
+        """
+        # A row may only be upserted once per statement, the last graph recorded for a document wins
+        records = dict(records)
+        if not records:
+            return
+
+        now = timezone.now()
+        params = []
+        for digest, graph_digest in records.items():
+            params.extend((digest, app_label, app_version, graph_digest, now))
+
+        with connections[router.db_for_write(self.model)].cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} (sha256, app_label, app_version, graph_sha256, date_created) '
+                'VALUES {values} '
+                'ON CONFLICT (sha256, app_label, app_version) DO UPDATE '
+                'SET graph_sha256 = EXCLUDED.graph_sha256, date_created = EXCLUDED.date_created'.format(
+                    table=self.model._meta.db_table,
+                    values=', '.join(['(%s, %s, %s, %s, %s)'] * len(records)),
+                ),
+                params
+            )
+
+
+class NormalizationRecord(models.Model):
+    """The graph a version of a provider's normalizer produced for a document.
+
+    A version of a normalizer always produces the same graph for the same document, so documents it has a record of
+    do not need to be normalized again. Bumping a provider's version invalidates every record of earlier versions.
+    Records are not keyed by source, as an app_label belongs to exactly one source, the user of its app config.
+    Graphs are recorded once stored. If their ChangeSet cannot be made their records are forgotten, see MakeJsonPatches.
+    """
+    BLANK_ID = re.compile(r'"_:[^"]*"')
+
+    id = models.AutoField(primary_key=True)
+
+    sha256 = models.TextField(validators=[validators.MaxLengthValidator(64)])  # Of the RawData
+    app_label = models.TextField()
+    app_version = models.TextField()
+    graph_sha256 = models.TextField(null=True, validators=[validators.MaxLengthValidator(64)])
+
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    objects = NormalizationRecordManager()
+
+    class Meta:
+        unique_together = (('sha256', 'app_label', 'app_version'),)
+
+    @classmethod
+    def graph_digest(cls, graph):
+        """The sha256 of a graph, ignoring the names of its blank nodes.
+        """
+        blank_ids = {}
+        data = json.dumps(graph, sort_keys=True, default=str)
+        # Blank node ids are random, number them in the order they appear instead
+        data = cls.BLANK_ID.sub(lambda match: blank_ids.setdefault(match.group(), '"_:{}"'.format(len(blank_ids))), data)
+        return sha256(data.encode()).hexdigest()
+
+    def __repr__(self):
+        return '<{}({}, {}, {})>'.format(self.__class__.__name__, self.app_label, self.app_version, self.sha256)
@@ -1,5 +1,6 @@
 import datetime as dt
 import json
+import zlib
 from decimal import Decimal
 from functools import partial
 
@@ -93,6 +94,90 @@ JSONField.register_lookup(lookups.HasKeys)
 JSONField.register_lookup(lookups.HasAnyKeys)
 
 
+class CompressedTextField(models.Field):
+    """A field of text that is compressed before being stored and decompressed when loaded.
+
+    Values are stored in a bytea column as a single byte naming how they were compressed, see CODECS,
+    followed by the compressed utf-8 bytes. Values that would not shrink are stored as UNCOMPRESSED.
+    The migration converting the column sets its storage to EXTERNAL, so Postgres does not try to compress it again.
+
+    Lookups are made against the stored value, so only exact matches work.
+    """
+
+    description = _('Compressed text')
+
+    UNCOMPRESSED = b'\x00'
+    CODECS = {
+        # name: (header, compress, decompress)
+        'zlib': (b'\x01', zlib.compress, zlib.decompress),
+    }
+
+    def __init__(self, *args, compression='zlib', **kwargs):
+        assert compression is None or compression in self.CODECS, 'compression must be None or one of {}'.format(tuple(self.CODECS))
+        self.compression = compression
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.compression != 'zlib':
+            kwargs['compression'] = self.compression
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection, context):
+        return self.decompress(value)
+
+    def to_python(self, value):
+        if isinstance(value, bytes):
+            return value.decode('utf-8')
+        return value
+
+    def get_prep_value(self, value):
+        return self.compress(super().get_prep_value(value))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return value
+        return connection.Database.Binary(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'widget': forms.Textarea, **kwargs})
+
+    def compress(self, value):
+        if value is None:
+            return value
+
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+
+        if self.compression is None:
+            return self.UNCOMPRESSED + value
+
+        header, compress = self.CODECS[self.compression][:2]
+        compressed = header + compress(value)
+
+        if len(compressed) > len(value):
+            return self.UNCOMPRESSED + value
+        return compressed
+
+    def decompress(self, value):
+        if value is None:
+            return value
+
+        value = bytes(value)
+        if value[:1] == self.UNCOMPRESSED:
+            return value[1:].decode('utf-8')
+
+        for header, _compress, decompress in self.CODECS.values():
+            if value[:1] == header:
+                return decompress(value[1:]).decode('utf-8')
+
+        raise ValueError('Unknown compression header {!r}'.format(value[:1]))
+
+
 class ShareOneToOneField(models.OneToOneField):
     def __init__(self, model, **kwargs):
         self.__kwargs = kwargs
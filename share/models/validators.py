@@ -37,7 +37,8 @@ class JSONLDValidator:
 
     __schema_cache = {}
     with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jsonld-schema.json')) as fobj:
-        jsonld_schema = Draft4Validator(ujson.load(fobj))
+        # Graphs validated in process, rather than parsed from JSON, may use tuples as arrays
+        jsonld_schema = Draft4Validator(ujson.load(fobj), types={'array': (list, tuple)})
 
     db_type_map = {
         'text': 'string',
@@ -167,4 +168,4 @@ class JSONLDValidator:
 
             schema['properties'][field.name] = self.json_schema_for_field(field)
 
-        return JSONLDValidator.__schema_cache.setdefault(model, Draft4Validator(schema))
+        return JSONLDValidator.__schema_cache.setdefault(model, Draft4Validator(schema, types={'array': (list, tuple)}))
@@ -0,0 +1,209 @@
+import time
+import logging
+import functools
+import multiprocessing
+from collections import deque
+
+from django.apps import apps
+from django.db import connections
+from django.db import transaction
+from django.utils import timezone
+
+from share.models import NormalizedData
+from share.models import NormalizationRecord
+from share.models.validators import JSONLDValidator
+from share.tasks import MakeJsonPatches
+
+logger = logging.getLogger(__name__)
+
+
+class BulkNormalizer:
+    """Normalize every RawData in a queryset using a pool of processes, for reprocessing a provider's entire history.
+
+    RawData are read out of the database a page at a time, in order of id, and handed to the workers in batches.
+    Pages are fetched by the last id seen rather than through a server side cursor, as no other query may be made
+    on a connection while one is open, and the in process worker writes on the same connection it reads from.
+    Each worker normalizes and validates its batch, stores the resulting NormalizedData in a single transaction
+    and then queues the creation of their ChangeSets, as NormalizerTask does for robots.
+    Documents whose graphs could not have changed are skipped, unless forced, see NormalizationRecord.
+
+    Args:
+        config (ProviderAppConfig): The provider whose normalizer to use
+        workers (int): The number of processes to normalize with.
+            0 normalizes in this process
+        batch_size (int): The number of RawData handed to a worker, and stored, at once
+        itersize (int): The number of RawData fetched from the database at once, the size of each page
+        report_interval (float): The minimum number of seconds between calls to on_progress
+        force (bool): Normalize and store every document, regardless of what has been done before
+    """
+
+    def __init__(self, config, workers=None, batch_size=100, itersize=2000, report_interval=10, force=False):
+        self.config = config
+        self.force = force
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.batch_size = batch_size
+        self.itersize = itersize
+        self.report_interval = report_interval
+
+    def run(self, queryset, on_progress=None):
+        """Normalize every RawData in queryset.
+
+        Args:
+            queryset (QuerySet): The RawData to normalize
+            on_progress (callable): Called with the current progress, see progress, as batches complete
+
+        Returns:
+            dict: The final progress, with the ids of every RawData that failed to normalize, and why, as errors
+        """
+        self.started, self.reported = time.monotonic(), 0
+        self.results = {'succeeded': 0, 'empty': 0, 'unchanged': 0, 'failed': {}}
+        self.on_progress = on_progress
+
+        if self.workers:
+            # Connections may not be shared with forked processes. Each worker will open its own
+            connections.close_all()
+            pool = multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(self.config.label, self.force))
+        else:
+            worker = _Worker(self.config, self.force)
+
+        # Limit how far ahead of the workers reading gets, so only a few batches are ever held in memory
+        pending = deque()
+        try:
+            for batch in self.batches(self.rows(queryset)):
+                if not self.workers:
+                    self.collect(worker(batch))
+                    continue
+
+                pending.append(pool.apply_async(_run_worker, (batch, )))
+                while len(pending) > self.workers * 2:
+                    self.collect(pending.popleft().get())
+
+            while pending:
+                self.collect(pending.popleft().get())
+        finally:
+            if self.workers:
+                if pending:
+                    pool.terminate()
+                else:
+                    pool.close()
+                pool.join()
+
+        self.report(force=True)
+        return {**self.progress(), 'errors': self.results['failed']}
+
+    def rows(self, queryset):
+        last = None
+        while True:
+            page = queryset.order_by('id').values_list('id', 'data', 'sha256')
+            if last is not None:
+                page = page.filter(id__gt=last)
+            page = list(page[:self.itersize])
+
+            yield from page
+
+            if len(page) < self.itersize:
+                return
+            last = page[-1][0]
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def collect(self, results):
+        self.results['succeeded'] += results['succeeded']
+        self.results['empty'] += results['empty']
+        self.results['unchanged'] += results['unchanged']
+        self.results['failed'].update(results['failed'])
+        self.report()
+
+    def progress(self):
+        elapsed = time.monotonic() - self.started
+        processed = self.results['succeeded'] + self.results['empty'] + self.results['unchanged'] + len(self.results['failed'])
+        return {
+            'processed': processed,
+            'succeeded': self.results['succeeded'],
+            'empty': self.results['empty'],
+            'unchanged': self.results['unchanged'],
+            'failed': len(self.results['failed']),
+            'elapsed': elapsed,
+            'rate': processed / elapsed if elapsed else 0,
+        }
+
+    def report(self, force=False):
+        if not self.on_progress or (not force and time.monotonic() - self.reported < self.report_interval):
+            return
+        self.reported = time.monotonic()
+        self.on_progress(self.progress())
+
+
+class _Worker:
+
+    def __init__(self, config, force=False):
+        self.config = config
+        self.force = force
+        self.normalizer = config.normalizer(config)
+        self.validator = JSONLDValidator()
+
+    def __call__(self, batch):
+        results = {'succeeded': 0, 'empty': 0, 'unchanged': 0, 'failed': {}}
+        normalized, records = [], []
+
+        if self.force:
+            done, graphs = set(), {}
+        else:
+            digests = [digest for _, _, digest in batch]
+            done = NormalizationRecord.objects.find_normalized(digests, self.config.label, self.config.version)
+            graphs = NormalizationRecord.objects.find_latest_graphs(digests, self.config.label)
+
+        for raw_id, data, digest in batch:
+            if digest in done:
+                results['unchanged'] += 1
+                continue
+
+            try:
+                graph = self.normalizer.normalize(data)
+                if not graph['@graph']:
+                    results['empty'] += 1
+                    records.append((digest, None))
+                    continue
+                self.validator(graph)
+            except Exception as e:
+                logger.exception('Failed to normalize (%s, %d)', self.config.label, raw_id)
+                results['failed'][raw_id] = repr(e)
+                continue
+
+            graph_digest = NormalizationRecord.graph_digest(graph)
+            records.append((digest, graph_digest))
+
+            if graphs.get(digest) == graph_digest:
+                results['unchanged'] += 1
+            else:
+                normalized.append(NormalizedData(created_at=timezone.now(), normalized_data=graph, source=self.config.user, raw_id=raw_id))
+
+        with transaction.atomic():
+            for datum in normalized:
+                datum.save()
+                transaction.on_commit(functools.partial(MakeJsonPatches().delay, datum.id, self.config.user.id))
+            NormalizationRecord.objects.record(records, self.config.label, self.config.version)
+
+        results['succeeded'] = len(normalized)
+        return results
+
+
+# The worker used by each process in the pool
+_worker = None
+
+
+def _init_worker(label, force):
+    global _worker
+    _worker = _Worker(apps.get_app_config(label), force)
+
+
+def _run_worker(batch):
+    return _worker(batch)
@@ -0,0 +1,222 @@
+from collections import OrderedDict
+
+from lxml import etree
+
+
+class XMLDict(OrderedDict):
+    """A dict, in the same format xmltodict produces, built from an lxml tree.
+
+    xpath_root is the element XPath expressions should be evaluated against, see XPathLink.
+    It is only set when the dict describes a single element, the only case xmltodict could unparse,
+    and when the converter that built this dict allows XPath.
+    converter is the XMLConverter that built this dict, used to convert XPath results.
+    """
+
+    xpath_root = None
+    converter = None
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        # Values are always handed out loaded, as code outside of this module may read their storage directly
+        for item in (value if isinstance(value, list) else (value, )):
+            if isinstance(item, XMLDict):
+                item._load()
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        self._materialize()
+        return super().items()
+
+    def values(self):
+        self._materialize()
+        return super().values()
+
+    def copy(self):
+        self._materialize()
+        copy = XMLDict(super().items())
+        copy.xpath_root, copy.converter = self.xpath_root, self.converter
+        return copy
+
+    def _load(self):
+        pass
+
+    def _materialize(self):
+        # Anything reading every value, such as json.dumps, may read the storage of nested dicts directly
+        # so the entire tree must be built up front
+        for value in super().values():
+            for item in (value if isinstance(value, list) else (value, )):
+                if isinstance(item, XMLDict):
+                    item._materialize()
+
+
+class LazyXMLDict(XMLDict):
+    """An XMLDict of an element's attributes, children and text that is only built when first accessed.
+
+    Children are themselves LazyXMLDicts, so only the parts of a document that are looked up are ever built.
+    Looking up a child builds its contents but not those of its own children.
+    Reading every value, via items or values, builds the entire tree below this dict.
+    """
+
+    def __init__(self, converter=None, element=None):
+        super().__init__()
+        self.converter, self._element = converter, element
+        self._xpath_root = None
+        self._pending = element is not None
+        self._materialized = False
+
+    @property
+    def xpath_root(self):
+        self._load()
+        return self._xpath_root
+
+    def tostring(self) -> bytes:
+        """The XML this dict is built from, which may be compared without building it.
+        """
+        return etree.tostring(self._element, with_tail=False)
+
+    def _load(self):
+        if not self._pending:
+            return
+        self._pending = False
+
+        items, xpath_root = self.converter.items(self._element)
+        for key, value in items.items():
+            OrderedDict.__setitem__(self, key, value)
+
+        if self.converter.xpath:
+            self._xpath_root = xpath_root
+
+    def _materialize(self):
+        if self._materialized:
+            return
+        self._load()
+        self._materialized = True
+        super()._materialize()
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        self._load()
+        # Comparisons of OrderedDicts read their contents directly
+        if isinstance(other, LazyXMLDict):
+            other._load()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+
+def _loaded(name):
+    method = getattr(XMLDict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in (
+    '__getitem__', '__setitem__', '__delitem__', '__contains__', '__iter__', '__reversed__', '__len__', '__repr__',
+    'keys', 'pop', 'popitem', 'setdefault', 'update', 'clear', 'move_to_end',
+):
+    setattr(LazyXMLDict, _name, _loaded(_name))
+
+
+class XMLConverter:
+    """Converts lxml elements into the format produced by xmltodict.parse(data, process_namespaces=True, namespaces=namespaces)
+
+    Elements with attributes or children become LazyXMLDicts, which are built when first accessed.
+
+    Args:
+        namespaces (dict): Maps namespace URIs to the prefix to use in their place. Prefixes of None are dropped
+        xpath (bool): Whether XPath links may evaluate against the lxml tree. Only safe for documents without a default namespace
+    """
+
+    def __init__(self, namespaces=None, xpath=True):
+        self.namespaces = namespaces
+        self.xpath = xpath
+
+    def parse(self, data: str) -> XMLDict:
+        # The encoding is forced as data has already been decoded, whatever its declaration says
+        # Documents come from untrusted providers, entities are never resolved and nothing is ever fetched
+        parser = etree.XMLParser(encoding='utf-8', remove_comments=True, remove_pis=True, resolve_entities=False, no_network=True, huge_tree=False)
+        return self.document(etree.fromstring(data.encode('utf-8'), parser=parser))
+
+    def document(self, element) -> XMLDict:
+        doc = XMLDict([(self.name(element.tag), self.value(element))])
+        doc.converter = self
+        if self.xpath:
+            doc.xpath_root = element
+        return doc
+
+    def convert(self, result):
+        """Convert a single XPath result.
+        """
+        if isinstance(result, str):
+            return str(result)
+        return self.document(result)
+
+    def name(self, tag: str) -> str:
+        if tag[0] != '{':
+            return tag
+
+        namespace, name = tag[1:].split('}', 1)
+        if not self.namespaces:
+            return namespace + ':' + name
+
+        short_namespace = self.namespaces.get(namespace, namespace)
+        if not short_namespace:
+            return name
+        return short_namespace + ':' + name
+
+    def value(self, element):
+        # Entities that could not be resolved are not included, as with xmltodict
+        if element.attrib or any(isinstance(child.tag, str) for child in element):
+            return LazyXMLDict(self, element)
+        return self.text(element)
+
+    def text(self, element):
+        data = [element.text] if element.text else []
+        data.extend(child.tail for child in element if child.tail)
+        return ''.join(data).strip() or None
+
+    def items(self, element):
+        """Build the contents of the dict for an element with attributes or children.
+
+        Returns:
+            (OrderedDict, element): The contents and, if the element has a single child and nothing else, that child
+        """
+        items = OrderedDict(('@' + self.name(key), value) for key, value in element.attrib.items())
+
+        children = []
+        for child in element:
+            if not isinstance(child.tag, str):
+                continue
+
+            children.append(child)
+            name, value = self.name(child.tag), self.value(child)
+            if name not in items:
+                items[name] = value
+            elif isinstance(items[name], list):
+                items[name].append(value)
+            else:
+                items[name] = [items[name], value]
+
+        data = self.text(element)
+        if data:
+            items['#text'] = data
+
+        return items, children[0] if len(items) == 1 and len(children) == 1 else None
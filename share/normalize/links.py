@@ -1,7 +1,13 @@
+import copy
+import datetime
 from collections import deque
+from collections import namedtuple
+from collections import OrderedDict
+from functools import lru_cache
 from functools import reduce
 import json
 import logging
+import re
 import threading
 
 import xmltodict
@@ -14,6 +20,9 @@ from pycountry import languages
 
 from nameparser import HumanName
 
+from share.normalize.document import XMLDict
+from share.normalize.document import LazyXMLDict
+
 logger = logging.getLogger(__name__)
 
 
@@ -90,10 +99,16 @@ def OneOf(*chains):
 
 
 # A wrapper around dicts that can have dicts as keys
+# Keys are compared by value. Each dict or list is reduced to a fingerprint once, which is cached against the object itself,
+# so lookups cost the same however large their keys are. Keys must not be mutated once used
 class DictHashingDict:
 
     def __init__(self):
         self.__inner = {}
+        # id(obj) -> (obj, fingerprint). obj is held so its id may not be reused
+        self.__fingerprints = {}
+        # structure -> fingerprint
+        self.__structures = {}
 
     def get(self, key, *args):
         return self.__inner.get(self._hash(key), *args)
@@ -108,11 +123,37 @@ class DictHashingDict:
         return self._hash(key) in self.__inner
 
     def _hash(self, val):
-        if isinstance(val, dict):
-            val = tuple((k, self._hash(v)) for k, v in val.items())
-        if isinstance(val, (list, tuple)):
-            val = tuple(self._hash(v) for v in val)
-        return val
+        if isinstance(val, tuple):
+            return self._fingerprint((list, tuple(self._hash(v) for v in val)))
+        if not isinstance(val, (dict, list)):
+            return val
+
+        try:
+            return self.__fingerprints[id(val)][1]
+        except KeyError:
+            pass
+
+        if isinstance(val, LazyXMLDict):
+            # Avoid building documents just to look them up
+            structure = (LazyXMLDict, val.tostring())
+        elif isinstance(val, dict):
+            # XMLDicts build every value they hold when their items are read
+            items = OrderedDict.items(val) if isinstance(val, XMLDict) else val.items()
+            structure = (dict, tuple((k, self._hash(v)) for k, v in items))
+        else:
+            structure = (list, tuple(self._hash(v) for v in val))
+
+        fingerprint = self._fingerprint(structure)
+        self.__fingerprints[id(val)] = (val, fingerprint)
+        return fingerprint
+
+    def _fingerprint(self, structure):
+        # Fingerprints are compared by identity, so they can never be equal to a key that is not a dict or list
+        return self.__structures.setdefault(structure, _Fingerprint())
+
+
+class _Fingerprint:
+    __slots__ = ()
 
 
 # BaseClass for all links
@@ -121,6 +162,10 @@ class DictHashingDict:
 # A chain is any number of links added together
 class AbstractLink:
 
+    # Record every link executed, and what it was executed against, in Context().frames
+    # Only useful when debugging parsers, as it roughly doubles the cost of running a chain
+    debug = False
+
     def __init__(self, _next=None, _prev=None):
         # next and prev are generally set by the __add__ method
         self._next = _next
@@ -141,6 +186,11 @@ class AbstractLink:
     def execute(self, obj):
         raise NotImplemented
 
+    # Prepare this link, and any chains it holds, to be run repeatedly
+    # Called by ParserMeta once the chain is complete. Returns self
+    def compile(self):
+        return self
+
     # Add a link into an existing chain
     def __add__(self, step):
         self._next = step
@@ -195,6 +245,11 @@ class AbstractLink:
         return '<{}()>'.format(self.__class__.__name__)
 
     def run(self, obj):
+        if self.debug:
+            return self.run_in_frame(obj)
+        return self.execute(obj)
+
+    def run_in_frame(self, obj):
         Context().frames.append({'link': self, 'context': obj})
         try:
             return self.execute(obj)
@@ -208,8 +263,21 @@ class AbstractLink:
 # original anchor
 class AnchorLink(AbstractLink):
 
+    # The links following this one, flattened by compile
+    _steps = None
+
+    def compile(self):
+        self._steps = self.chain()[1:]
+        for step in self._steps:
+            step.compile()
+        return self
+
     def execute(self, obj):
-        return reduce(lambda acc, cur: cur.run(acc), self.chain()[1:], obj)
+        if self._steps is None:
+            self.compile()
+        for step in self._steps:
+            obj = step.run(obj)
+        return obj
 
 
 class Context(AnchorLink):
@@ -244,40 +312,126 @@ class Context(AnchorLink):
         return AnchorLink() + step
 
 
+class ParsedName(namedtuple('ParsedName', ('title', 'first', 'middle', 'last', 'suffix', 'nickname'))):
+    """The parts of a HumanName, which, unlike a HumanName, may be safely shared.
+
+    Parts may be accessed as attributes or, as with HumanName, by name.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    @classmethod
+    def from_human_name(cls, name):
+        return cls(*(getattr(name, part) for part in cls._fields))
+
+
 class NameParserLink(AbstractLink):
     def execute(self, obj):
-        return HumanName(obj)
+        if isinstance(obj, str):
+            return self.parse(obj)
+        return ParsedName.from_human_name(HumanName(obj))
+
+    # Parsers often build several fields from the same name, parsed names are immutable so they may be shared
+    # between every parser and document
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def parse(name):
+        return ParsedName.from_human_name(HumanName(name))
 
 
 class DateParserLink(AbstractLink):
+    # ISO 8601 dates and datetimes, as sent by OAI-PMH and most APIs, are parsed without arrow
+    ISO_8601 = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?(Z|[+-]\d{2}:?\d{2})?)?$')
+
     def execute(self, obj):
         if obj:
+            if isinstance(obj, str):
+                return self.parse(obj)
             return arrow.get(obj).to('UTC').isoformat()
         return None
 
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse(date):
+        match = DateParserLink.ISO_8601.match(date)
+        if match:
+            try:
+                return DateParserLink.parse_iso(*match.groups())
+            except (ValueError, OverflowError):
+                pass  # Out of range values are left for arrow to report
+        return arrow.get(date).to('UTC').isoformat()
+
+    @staticmethod
+    def parse_iso(year, month, day, hour, minute, second, fraction, offset):
+        date = datetime.datetime(
+            int(year), int(month), int(day),
+            int(hour or 0), int(minute or 0), int(second or 0), int((fraction or '').ljust(6, '0')),
+            tzinfo=datetime.timezone.utc
+        )
+        if offset and offset != 'Z':
+            date -= (-1 if offset[0] == '-' else 1) * datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[-2:]))
+        return date.isoformat()
+
 
 class LanguageParserLink(AbstractLink):
+    # Maps every code and name known to pycountry to its ISO 639-3 code, built on first use
+    # Exact matches take precedence over case insensitive ones, as some codes differ from names only by case
+    EXACT, CASEFOLDED = None, None
+
     def execute(self, maybe_code):
         if isinstance(maybe_code, dict):
             maybe_code = maybe_code['#text']
+        if not isinstance(maybe_code, str):
+            return None
+        return self.lookup(maybe_code)
+
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def lookup(maybe_code):
+        if LanguageParserLink.EXACT is None:
+            LanguageParserLink.build()
+
+        maybe_code = maybe_code.strip()
+        try:
+            return LanguageParserLink.EXACT[maybe_code]
+        except KeyError:
+            return LanguageParserLink.CASEFOLDED.get(maybe_code.casefold())
+
+    @classmethod
+    def build(cls):
         # Force indices to populate
         if not languages._is_loaded:
             languages._load()
 
-        for kwarg in languages.indices.keys():
-            try:
-                return languages.get(**{kwarg: maybe_code}).iso639_3_code
-            except KeyError:
-                continue
-        return None
+        exact, casefolded = {}, {}
+        for index in languages.indices.values():
+            for value, language in index.items():
+                code = getattr(language, 'iso639_3_code', None)
+                if code is None:
+                    continue
+                exact.setdefault(value, code)
+                casefolded.setdefault(value.casefold(), code)
+
+        cls.EXACT, cls.CASEFOLDED = exact, casefolded
 
 
 class ConcatLink(AbstractLink):
     def __init__(self, *chains, deep=False):
         self._chains = chains
+        self._heads = tuple(chain.chain()[0] for chain in chains)
         self._deep = deep
         super().__init__()
 
+    def compile(self):
+        for head in self._heads:
+            head.compile()
+        return self
+
     def _concat(self, acc, val):
         if val is None:
             return acc
@@ -288,10 +442,7 @@ class ConcatLink(AbstractLink):
         return acc + [v for v in val if v != '' and v is not None]
 
     def execute(self, obj):
-        return reduce(self._concat, [
-            chain.chain()[0].run(obj)
-            for chain in self._chains
-        ], [])
+        return reduce(self._concat, [head.run(obj) for head in self._heads], [])
 
 
 class JoinLink(AbstractLink):
@@ -330,6 +481,14 @@ class IteratorLink(AbstractLink):
         self.__anchor.chain()[-1] + chain[0]
         return self
 
+    def compile(self):
+        self.__anchor.compile()
+        return self
+
+    # GetIndexLink finds the list being iterated over through this link's frame, so it is always recorded
+    def run(self, obj):
+        return self.run_in_frame(obj)
+
     def execute(self, obj):
         if not isinstance(obj, (list, tuple)):
             obj = (obj, )
@@ -348,14 +507,16 @@ class MaybeLink(AbstractLink):
         self.__anchor.chain()[-1] + step
         return self
 
+    def compile(self):
+        self.__anchor.compile()
+        return self
+
     def execute(self, obj):
         if not obj:
             return []
         val = obj.get(self._segment)
         if val:
             return self.__anchor.run(val)
-        if len(Context().frames) > 1 and isinstance(Context().frames[-2]['link'], (IndexLink, IteratorLink, ConcatLink, JoinLink)):
-            return []
         return self._default
 
 
@@ -363,6 +524,7 @@ class TryLink(AbstractLink):
     def __init__(self, chain, default=None):
         super().__init__()
         self._chain = chain
+        self._head = chain.chain()[0]
         self._default = default
         self.__anchor = AnchorLink()
 
@@ -371,9 +533,14 @@ class TryLink(AbstractLink):
         self.__anchor.chain()[-1] + step
         return self
 
+    def compile(self):
+        self._head.compile()
+        self.__anchor.compile()
+        return self
+
     def execute(self, obj):
         try:
-            val = self._chain.chain()[0].run(obj)
+            val = self._head.run(obj)
         except (IndexError, KeyError):
             return self._default
         except TypeError as err:
@@ -430,10 +597,20 @@ class XPathLink(AbstractLink):
         super().__init__()
 
     def execute(self, obj):
-        unparsed_obj = xmltodict.unparse(obj)
-        xml_obj = etree.XML(unparsed_obj.encode())
-        elem = xml_obj.xpath(self._xpath)
-        elems = [xmltodict.parse(etree.tostring(x)) for x in elem]
+        root = getattr(obj, 'xpath_root', None)
+
+        if root is None:
+            unparsed_obj = xmltodict.unparse(obj)
+            xml_obj = etree.XML(unparsed_obj.encode())
+            elem = xml_obj.xpath(self._xpath)
+            elems = [xmltodict.parse(etree.tostring(x)) for x in elem]
+        else:
+            # Evaluate against the lxml tree obj was built from, see share.normalize.document
+            # Absolute paths must only search obj, as they would if obj had been unparsed
+            if root.getparent() is not None:
+                root = copy.deepcopy(root)
+            elems = [obj.converter.convert(x) for x in root.xpath(self._xpath)]
+
         if len(elems) == 1 and not isinstance(self._next, (IndexLink, IteratorLink)):
             return elems[0]
         return elems
@@ -496,13 +673,19 @@ class OneOfLink(AbstractLink):
 
     def __init__(self, *chains):
         self._chains = chains
+        self._heads = tuple(chain.chain()[0] for chain in chains)
         super().__init__()
 
+    def compile(self):
+        for head in self._heads:
+            head.compile()
+        return self
+
     def execute(self, obj):
         errors = []
-        for chain in self._chains:
+        for head in self._heads:
             try:
-                return chain.chain()[0].run(obj)
+                return head.run(obj)
             except Exception as e:
                 errors.append(e)
 
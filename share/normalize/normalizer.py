@@ -1,10 +1,16 @@
 import abc
 import json
+import logging
 
 import xmltodict
 
+from lxml import etree
+
+from share.normalize.document import XMLConverter
 from share.normalize.links import Context
 
+logger = logging.getLogger(__name__)
+
 
 # NOTE: Context is a thread local singleton
 # It is assigned to ctx here just to keep a family interface
@@ -14,6 +20,9 @@ ctx = Context()
 class Normalizer(metaclass=abc.ABCMeta):
 
     root_parser = None
+    # Allow XPath links to evaluate against the lxml tree of XML documents, rather than reparsing them
+    # Only safe for documents without a default namespace, as XPath would otherwise need to be namespace aware
+    native_xpath = False
 
     NAMESPACES = {
         'http://purl.org/dc/elements/1.1/': 'dc',
@@ -24,6 +33,7 @@ class Normalizer(metaclass=abc.ABCMeta):
     def __init__(self, app_config):
         self.config = app_config
         self.namespaces = getattr(self.config, 'namespaces', self.NAMESPACES)
+        self.native_xpath = getattr(self.config, 'native_xpath', self.native_xpath)
 
     def do_normalize(self, data):
         parsed = self.unwrap_data(data)
@@ -33,6 +43,11 @@ class Normalizer(metaclass=abc.ABCMeta):
 
     def unwrap_data(self, data):
         if data.startswith('<'):
+            # Documents are only converted to dicts as they are accessed
+            try:
+                return XMLConverter(self.namespaces, xpath=self.native_xpath).parse(data)
+            except etree.XMLSyntaxError as e:
+                logger.warning('Unable to parse document with lxml, falling back to xmltodict: %s', e)
             return xmltodict.parse(data, process_namespaces=True, namespaces=self.namespaces)
         else:
             return json.loads(data)
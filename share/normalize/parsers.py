@@ -1,4 +1,5 @@
 import uuid
+from collections import namedtuple
 from functools import reduce
 
 from django.apps import apps
@@ -13,19 +14,24 @@ from share.normalize.links import AbstractLink
 ctx = Context()
 
 
+# What a parser needs to know about the model field each of its chains populates
+ParsedField = namedtuple('ParsedField', ('name', 'chain', 'field', 'is_relation', 'many_to_many', 'm2m_field_name'))
+
+
 class ParserMeta(type):
 
     def __new__(cls, name, bases, attrs):
         # Enabled inheritance in parsers.
+        # Chains are compiled once here rather than every time a document is parsed
         parsers = reduce(lambda acc, val: {**acc, **getattr(val, 'parsers', {})}, bases[::-1], {})
         for key, value in tuple(attrs.items()):
             if isinstance(value, AbstractLink):
-                parsers[key] = attrs.pop(key).chain()[0]
+                parsers[key] = attrs.pop(key).chain()[0].compile()
         attrs['parsers'] = parsers
 
         attrs['_extra'] = reduce(lambda acc, val: {**acc, **getattr(val, '_extra', {})}, bases[::-1], {})
         attrs['_extra'].update({
-            key: value.chain()[0]
+            key: value.chain()[0].compile()
             for key, value
             in attrs.pop('Extra', object).__dict__.items()
             if isinstance(value, AbstractLink)
@@ -56,6 +62,25 @@ class Parser(metaclass=ParserMeta):
     def model(self):
         return apps.get_model('share', self.schema)
 
+    @property
+    def fields(self):
+        # Looked up the first time each parser is used rather than when it is defined, as apps may not be ready yet.
+        # Cached per schema, as some parsers pick their schema based on the document being parsed. See OAICreativeWork
+        cls, schema = type(self), self.schema
+        if '_fields' not in cls.__dict__:
+            cls._fields = {}
+        if schema not in cls._fields:
+            model, fields = self.model, []
+            for key, chain in self.parsers.items():
+                try:
+                    field = model._meta.get_field(key)
+                except FieldDoesNotExist:
+                    raise Exception('Tried to parse value {} which does not exist on {}'.format(key, model))
+                many_to_many = field.is_relation and field.rel.many_to_many
+                fields.append(ParsedField(key, chain, field, field.is_relation, many_to_many, field.m2m_field_name() if many_to_many else None))
+            cls._fields[schema] = tuple(fields)
+        return cls._fields[schema]
+
     def __init__(self, context, config=None):
         self.config = config or ctx._config
         self.context = context
@@ -64,12 +89,12 @@ class Parser(metaclass=ParserMeta):
 
     def validate(self, field, value):
         if field.is_relation:
-            if field.rel.many_to_many:
-                assert isinstance(value, (list, tuple)), 'Values for field {} must be lists. Found {}'.format(field, value)
+            if field.many_to_many:
+                assert isinstance(value, (list, tuple)), 'Values for field {} must be lists. Found {}'.format(field.field, value)
             else:
-                assert isinstance(value, dict) and '@id' in value and '@type' in value, 'Values for field {} must be a dictionary with keys @id and @type. Found {}'.format(field, value)
+                assert isinstance(value, dict) and '@id' in value and '@type' in value, 'Values for field {} must be a dictionary with keys @id and @type. Found {}'.format(field.field, value)
         else:
-            assert not isinstance(value, dict), 'Value for non-relational field {} must be a primative type. Found {}'.format(field, value)
+            assert not isinstance(value, dict), 'Value for non-relational field {} must be a primative type. Found {}'.format(field.field, value)
 
     def parse(self):
         if (self.context, self.schema) in ctx.pool:
@@ -80,21 +105,16 @@ class Parser(metaclass=ParserMeta):
 
         prev, Context().parser = Context().parser, self
 
-        for key, chain in self.parsers.items():
-            try:
-                field = self.model._meta.get_field(key)
-            except FieldDoesNotExist:
-                raise Exception('Tried to parse value {} which does not exist on {}'.format(key, self.model))
-
-            value = chain.run(self.context)
+        for field in self.fields:
+            value = field.chain.run(self.context)
 
-            if value and field.is_relation and field.rel.many_to_many:
+            if value and field.many_to_many:
                 for v in value:
-                    ctx.pool[v][field.m2m_field_name()] = self.ref
+                    ctx.pool[v][field.m2m_field_name] = self.ref
 
             if value is not None:
                 self.validate(field, value)
-                inst[key] = value
+                inst[field.name] = value
 
         inst['extra'] = {}
         for key, chain in self._extra.items():
@@ -16,6 +16,7 @@ class ProviderAppConfig(RobotAppConfig, metaclass=abc.ABCMeta):
     schedule = crontab(minute=0, hour=0)
     task = 'share.tasks.HarvesterTask'
     description = 'TODO'  # TODO
+    harvest_concurrency = 2  # Maximum number of date windows to harvest at once, see share.harvest.planner
 
     @abc.abstractproperty
     def title(self):
@@ -1,4 +1,5 @@
 import abc
+import random
 import logging
 import datetime
 
@@ -9,9 +10,13 @@ import requests
 from django.apps import apps
 from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.utils import timezone
 
 from share.change import ChangeGraph
-from share.models import RawData, NormalizedData, ChangeSet, CeleryProviderTask, ShareUser
+from share.harvest.planner import HarvestPlanner
+from share.models import RawData, NormalizedData, NormalizationRecord, ChangeSet, CeleryProviderTask, ShareUser
+from share.models.validators import JSONLDValidator
 
 
 logger = logging.getLogger(__name__)
@@ -55,63 +60,181 @@ class ProviderTask(celery.Task):
 
 class HarvesterTask(ProviderTask):
 
-    def do_run(self, start: [str, datetime.datetime]=None, end: [str, datetime.datetime]=None):
-        if self.config.disabled:
-            raise Exception('Harvester {} is disabled. Either enable it or disable it\'s celery beat entry'.format(self.config))
+    normalize_batch_size = 100  # Number of RawData to normalize per BatchNormalizerTask
+
+    def do_run(self, start: [str, datetime.datetime]=None, end: [str, datetime.datetime]=None, resume: bool=False, plan: dict=None, renormalize: bool=False):
+        # Only explicitly specified ranges may be resumed by a later run
+        self.window = {'start': str(start), 'end': str(end)} if start and end else {}
+
+        checkpoint = self.task.checkpoint
+        if not checkpoint and resume and self.window:
+            checkpoint = self.find_checkpoint()
 
         if not start and not end:
-            start, end = datetime.timedelta(days=-1), datetime.datetime.utcnow()
+            end = datetime.datetime.utcnow()
+            start = end - datetime.timedelta(days=1)
         if type(end) is str:
             end = arrow.get(end).datetime
         if type(start) is str:
             start = arrow.get(start).datetime
 
+        # Every harvest records the range it covers, and the plan it is a part of, see HarvestPlanner
+        self.details = {'range': {'start': arrow.get(start).isoformat(), 'end': arrow.get(end).isoformat()}}
+        if plan:
+            self.details['plan'] = {'id': plan['id'], 'window': plan['window']}
+        self.save_checkpoint(checkpoint or {})
+
+        if self.config.disabled:
+            raise Exception('Harvester {} is disabled. Either enable it or disable it\'s celery beat entry'.format(self.config))
+
         harvester = self.config.harvester(self.config)
 
         try:
-            logger.info('Starting harvester run for %s %s - %s', self.config.label, start, end)
-            raws = harvester.harvest(start, end)
-            logger.info('Collected %d data blobs from %s', len(raws), self.config.label)
+            if plan:
+                logger.info('Starting harvester run for %s %s - %s, window %d of plan %s', self.config.label, start, end, plan['window'] + 1, plan['id'])
+            else:
+                logger.info('Starting harvester run for %s %s - %s', self.config.label, start, end)
+
+            count, raw_ids = 0, []
+            # RawData is yielded as soon as it is committed, normalize it while the rest of the range is harvested
+            # Exact copies of previously harvested documents are only normalized again if renormalize is set
+            for raw in harvester.harvest(start, end, checkpoint=checkpoint, on_checkpoint=self.save_checkpoint, unchanged=renormalize):
+                # attach task
+                raw.tasks.add(self.task)
+                raw_ids.append(raw.pk)
+                count += 1
+
+                if len(raw_ids) >= self.normalize_batch_size:
+                    self.normalize(raw_ids)
+                    raw_ids = []
+
+            if raw_ids:
+                self.normalize(raw_ids)
+
+            logger.info('Collected %d data blobs from %s', count, self.config.label)
         except Exception as e:
             logger.exception('Failed harvester task (%s, %s, %s)', self.config.label, start, end)
-            raise self.retry(countdown=10, exc=e)
+            # Back off exponentially, with jitter, rather than hammering a struggling provider
+            raise self.retry(countdown=min(10 * 2 ** self.request.retries, 60 * 60) * random.uniform(0.5, 1.5), exc=e)
+
+    def normalize(self, raw_ids):
+        task = BatchNormalizerTask().apply_async((self.config.label, self.started_by.id, raw_ids,))
+        logger.debug('Started normalizer task %s for %d documents', task, len(raw_ids))
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        super().on_failure(exc, task_id, args, kwargs, einfo)
+        if kwargs.get('plan'):
+            HarvestPlanner.advance(kwargs['plan']['id'])
 
-        for raw in raws:
-            # attach task
-            raw.tasks.add(self.task)
+    def on_success(self, retval, task_id, args, kwargs):
+        super().on_success(retval, task_id, args, kwargs)
+        if kwargs.get('plan'):
+            HarvestPlanner.advance(kwargs['plan']['id'])
+
+    def save_checkpoint(self, checkpoint):
+        self.task.checkpoint = {**checkpoint, **self.window, **self.details}
+        CeleryProviderTask.objects.filter(uuid=self.request.id).update(checkpoint=self.task.checkpoint)
+
+    def find_checkpoint(self):
+        previous = CeleryProviderTask.objects.filter(
+            name=self.name,
+            app_label=self.config.label,
+            app_version=self.config.version,
+            checkpoint__contains=self.window,
+        ).exclude(uuid=self.request.id).first()
 
-            task = NormalizerTask().apply_async((self.config.label, self.started_by.id, raw.pk,))
-            logger.debug('Started normalizer task %s for %s', task, raw.id)
+        # Only resume if the latest attempt at this range did not finish
+        if not previous or previous.status == CeleryProviderTask.STATUS.succeeded:
+            return None
+
+        logger.info('Resuming %s harvest of %s - %s from %s after %s documents', self.config.label, self.window['start'], self.window['end'], previous.uuid, previous.checkpoint.get('count'))
+        return previous.checkpoint
 
 
 class NormalizerTask(ProviderTask):
 
-    def do_run(self, raw_id):
+    def do_run(self, raw_id, force=False):
         raw = RawData.objects.get(pk=raw_id)
         normalizer = self.config.normalizer(self.config)
 
-        assert raw.source == self.config.user, 'RawData is from {}. Tried parsing it as {}'.format(raw.source, self.config)
+        try:
+            self.normalize(normalizer, raw, force=force)
+        except Exception as e:
+            logger.exception('Failed normalizer task (%s, %d)', self.config.label, raw_id)
+            raise self.retry(countdown=10, exc=e)
+
+    def normalize(self, normalizer, raw, force=False):
+        """Normalize a single RawData and submit the resulting graph.
+
+        Documents this version of the normalizer has already processed are skipped, see NormalizationRecord,
+        as are graphs identical to the latest one any version produced for the same document.
+
+        Args:
+            force (bool): Normalize and submit the document regardless of what has been done before
+
+        Returns:
+            NormalizedData: The submitted data, or None if the graph was empty or unchanged
+        """
+        assert raw.source_id == self.config.user.id, 'RawData is from {}. Tried parsing it as {}'.format(raw.source, self.config)
+
+        if not force and NormalizationRecord.objects.find_normalized([raw.sha256], self.config.label, self.config.version):
+            logger.info('%s has already been normalized by %s version %s, skipping...', raw, self.config.label, self.config.version)
+            return None
 
         logger.info('Starting normalization for %s by %s', raw, normalizer)
 
-        try:
-            graph = normalizer.normalize(raw)
+        graph = normalizer.normalize(raw)
 
-            if not graph['@graph']:
-                logger.warning('Graph was empty for %s, skipping...', raw)
-                return
+        if not graph['@graph']:
+            logger.warning('Graph was empty for %s, skipping...', raw)
+            NormalizationRecord.objects.record([(raw.sha256, None)], self.config.label, self.config.version)
+            return None
 
-            normalized_data_url = settings.SHARE_API_URL[0:-1] + reverse('api:normalizeddata-list')
-            resp = requests.post(normalized_data_url, json={
-                'created_at': datetime.datetime.utcnow().isoformat(),
-                'normalized_data': graph,
-            }, headers={'Authorization': self.config.authorization()})
-        except Exception as e:
-            logger.exception('Failed normalizer task (%s, %d)', self.config.label, raw_id)
-            raise self.retry(countdown=10, exc=e)
+        digest = NormalizationRecord.graph_digest(graph)
+        if not force and NormalizationRecord.objects.find_latest_graphs([raw.sha256], self.config.label).get(raw.sha256) == digest:
+            logger.info('Graph for %s is unchanged from the latest one produced by %s, skipping...', raw, self.config.label)
+            NormalizationRecord.objects.record([(raw.sha256, digest)], self.config.label, self.config.version)
+            return None
+
+        # Robots are trusted to submit directly rather than through the API
+        if self.config.user.is_robot:
+            normalized = self.submit(raw, graph)
+        else:
+            normalized = self.post(raw, graph)
+
+        NormalizationRecord.objects.record([(raw.sha256, digest)], self.config.label, self.config.version)
+
+        logger.info('Successfully submitted change for %s', raw)
+        return normalized
+
+    def submit(self, raw, graph):
+        """Validate and store the graph in process, then queue the creation of its ChangeSet.
+        """
+        JSONLDValidator()(graph)
+
+        with transaction.atomic():
+            normalized = NormalizedData.objects.create(
+                created_at=timezone.now(),
+                normalized_data=graph,
+                source=self.config.user,
+                raw=raw,
+            )
+            normalized.tasks.add(self.task)
+
+        MakeJsonPatches().delay(normalized.id, self.config.user.id)
+        return normalized
+
+    def post(self, raw, graph):
+        """Submit the graph through the normalized data API.
+        """
+        normalized_data_url = settings.SHARE_API_URL[0:-1] + reverse('api:normalizeddata-list')
+        resp = requests.post(normalized_data_url, json={
+            'created_at': datetime.datetime.utcnow().isoformat(),
+            'normalized_data': graph,
+        }, headers={'Authorization': self.config.authorization()})
 
         if (resp.status_code // 100) != 2:
-            raise self.retry(countdown=10, exc=Exception('Unable to submit change graph. Received {!r}, {}'.format(resp, resp.content)))
+            raise Exception('Unable to submit change graph. Received {!r}, {}'.format(resp, resp.content))
 
         # attach task
         normalized_id = resp.json()['normalized_id']
@@ -120,7 +243,51 @@ class NormalizerTask(ProviderTask):
         normalized.tasks.add(self.task)
         normalized.save()
 
-        logger.info('Successfully submitted change for %s', raw)
+        return normalized
+
+
+class BatchNormalizerTask(NormalizerTask):
+    """Normalize many RawData in a single task, loading them with one query and sharing one normalizer.
+
+    The outcome for each RawData is recorded in the task's checkpoint as
+    {'succeeded': [ids], 'empty': [ids], 'failed': {id: error}}.
+    empty includes RawData that were skipped as their graph could not have changed, see NormalizerTask.normalize.
+    If any failed, the task is retried with only the failed ids.
+    """
+
+    def do_run(self, raw_ids, force=False):
+        normalizer = self.config.normalizer(self.config)
+        # Retries only process the previous attempt's failures, keep the earlier outcomes
+        previous = self.task.checkpoint or {}
+        results = {'succeeded': previous.get('succeeded', []), 'empty': previous.get('empty', []), 'failed': {}}
+
+        raws = {raw.id: raw for raw in RawData.objects.filter(pk__in=raw_ids)}
+
+        for raw_id in raw_ids:
+            if raw_id not in raws:
+                results['failed'][str(raw_id)] = 'RawData {} does not exist'.format(raw_id)
+                continue
+
+            try:
+                normalized = self.normalize(normalizer, raws[raw_id], force=force)
+            except Exception as e:
+                logger.exception('Failed to normalize (%s, %d)', self.config.label, raw_id)
+                results['failed'][str(raw_id)] = repr(e)
+            else:
+                results['succeeded' if normalized else 'empty'].append(raw_id)
+
+        self.task.checkpoint = results
+        CeleryProviderTask.objects.filter(uuid=self.request.id).update(checkpoint=results)
+
+        retry_ids = [raw_id for raw_id in raw_ids if raw_id in raws and str(raw_id) in results['failed']]
+        logger.info('Normalized %d of %d documents for %s', len(raw_ids) - len(results['failed']), len(raw_ids), self.config.label)
+
+        if retry_ids:
+            raise self.retry(
+                args=(self.config.label, self.started_by.id, retry_ids),
+                countdown=10,
+                exc=Exception('Failed to normalize {} of {} documents'.format(len(retry_ids), len(raw_ids))),
+            )
 
 
 class MakeJsonPatches(celery.Task):
@@ -143,6 +310,13 @@ class MakeJsonPatches(celery.Task):
 
         logger.info('Finished make JSON patches for %s by %s at %s', normalized, started_by, datetime.datetime.utcnow().isoformat())
 
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # The graph was recorded as submitted when it was stored, see NormalizationRecord.
+        # It never made it into the database, so its document must not be skipped the next time it is normalized
+        normalized = NormalizedData.objects.select_related('raw').filter(pk=kwargs.get('normalized_id', args[0] if args else None)).first()
+        if normalized and normalized.raw:
+            NormalizationRecord.objects.forget(normalized.raw.sha256, normalized.raw.app_label, NormalizationRecord.graph_digest(normalized.normalized_data))
+
 
 class BotTask(ProviderTask):
 
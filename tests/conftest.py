@@ -1,8 +1,41 @@
+import time
+
 import pytest
 
 from share.models import Person, NormalizedData, Change, ChangeSet
 from share.models import ShareUser
 from share.change import ChangeNode, ChangeGraph
+from share.harvest.harvester import Harvester
+
+
+class PagedHarvester(Harvester):
+    """Harvests `pages` pages of 10 documents, resuming from the page given by its cursor.
+
+    The cursor of each page is its number, except for the first page whose cursor is first_cursor,
+    as providers such as OAI-PMH have no token for the first page.
+    """
+    rate_limit = (100, 1)
+    pages = 5
+    first_cursor = 0
+    fail = False
+    interrupt = None  # The number of the document to fail on, as if the provider went away part way through a page
+
+    def do_harvest(self, start_date, end_date):
+        for page in range(self.cursor or 0, self.pages):
+            self.cursor = page or self.first_cursor
+            time.sleep(0.01)
+            for i in range(10):
+                if page * 10 + i == self.interrupt:
+                    raise ConnectionError('Provider went away')
+                yield str(page * 10 + i), {'page': page, 'index': i}
+        if self.fail:
+            raise ValueError('Provider went away')
+
+
+@pytest.fixture
+def paged_harvester():
+    # A new class for every test, so tests may change its attributes freely
+    return type('PagedHarvester', (PagedHarvester, ), {})
 
 
 @pytest.fixture
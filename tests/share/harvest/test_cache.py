@@ -0,0 +1,84 @@
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from share.harvest.cache import CacheMiss
+from share.harvest.cache import HTTPCache
+from share.harvest.session import HarvesterSession
+
+
+class MockAdapter(BaseAdapter):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.reason = 'OK'
+        resp.headers.update({'Content-Type': 'text/xml', 'Content-Encoding': 'gzip'})
+        resp.request = request
+        resp.url = request.url
+        resp._content = '<response>{} {}</response>'.format(request.method, request.url).encode()
+        return resp
+
+    def close(self):
+        pass
+
+
+def make_session(directory, mode):
+    session = HarvesterSession(cache=HTTPCache(directory, mode=mode))
+    session.adapter = MockAdapter()
+    session.mount('http://', session.adapter)
+    return session
+
+
+class TestHTTPCache:
+
+    def test_passthrough(self, tmpdir):
+        session = make_session(str(tmpdir), 'passthrough')
+        session.get('http://example.com')
+
+        assert session.cache is None
+        assert tmpdir.listdir() == []
+
+    def test_record_then_replay(self, tmpdir):
+        recorder = make_session(str(tmpdir), 'record')
+        recorded = recorder.get('http://example.com', params={'verb': 'ListRecords'})
+
+        replayer = make_session(str(tmpdir), 'replay')
+        replayed = replayer.get('http://example.com', params={'verb': 'ListRecords'})
+
+        assert replayer.adapter.requests == []
+        assert replayed.status_code == 200
+        assert replayed.url == recorded.url
+        assert replayed.content == recorded.content
+        assert replayed.text == recorded.text
+        assert replayed.headers['Content-Type'] == 'text/xml'
+        assert 'Content-Encoding' not in replayed.headers
+
+    def test_replay_streamed(self, tmpdir):
+        make_session(str(tmpdir), 'record').get('http://example.com')
+        resp = make_session(str(tmpdir), 'replay').get('http://example.com', stream=True)
+
+        assert b''.join(resp.iter_content(4)) == b'<response>GET http://example.com/</response>'
+
+    def test_keyed_by_request(self, tmpdir):
+        make_session(str(tmpdir), 'record').get('http://example.com', params={'page': 1})
+        replayer = make_session(str(tmpdir), 'replay')
+
+        with pytest.raises(CacheMiss):
+            replayer.get('http://example.com', params={'page': 2})
+
+        with pytest.raises(CacheMiss):
+            replayer.post('http://example.com', params={'page': 1})
+
+    def test_record_overwrites(self, tmpdir):
+        cache = HTTPCache(str(tmpdir), mode='record')
+        session = make_session(str(tmpdir), 'record')
+        resp = session.get('http://example.com')
+        resp._content = b'changed'
+        cache.put(resp.request, resp)
+
+        assert make_session(str(tmpdir), 'replay').get('http://example.com').content == b'changed'
@@ -0,0 +1,130 @@
+import arrow
+import pytest
+
+from share.models import RawData
+
+
+class MockConfig:
+    label = 'harvester.test'
+    rate_limit = (100, 1)
+
+
+@pytest.fixture(params=[0, 15])
+def harvester(request, paged_harvester):
+    harvester = paged_harvester(MockConfig())
+    harvester.prefetch = request.param
+    return harvester
+
+
+class TestHarvester:
+
+    def test_documents_are_paired_with_cursors(self, harvester):
+        documents = list(harvester._do_harvest(arrow.utcnow(), arrow.utcnow()))
+
+        assert [doc_id for _, doc_id, _ in documents] == [str(i) for i in range(50)]
+        assert all(cursor == datum['page'] for cursor, _, datum in documents)
+
+    def test_errors_propagate(self, harvester):
+        harvester.fail = True
+
+        with pytest.raises(ValueError):
+            list(harvester._do_harvest(arrow.utcnow(), arrow.utcnow()))
+
+    def test_raw_limit(self, harvester):
+        raw = list(harvester.raw(arrow.get('2016-01-01'), arrow.get('2016-01-02'), limit=3))
+
+        assert [doc_id for doc_id, _ in raw] == ['0', '1', '2']
+        assert raw[0][1] == b'{\n    "index": 0,\n    "page": 0\n}'
+
+    def test_session_settings(self, paged_harvester):
+        config = MockConfig()
+        config.timeout, config.retries = 5, 7
+        harvester = paged_harvester(config)
+
+        assert harvester.requests is harvester.session
+        assert harvester.session.timeout == 5
+        assert harvester.session.rate_limiter is harvester.rate_limiter
+        assert harvester.session.get_adapter('https://example.com').max_retries.total == 7
+
+
+@pytest.mark.django_db
+class TestHarvestStorage:
+
+    @pytest.fixture
+    def harvester(self, share_source, paged_harvester):
+        harvester = paged_harvester(MockConfig())
+        harvester.source = share_source
+        harvester.batch_size = 20
+        return harvester
+
+    def harvest(self, harvester, **kwargs):
+        return list(harvester.harvest(arrow.get('2016-01-01'), arrow.get('2016-01-02'), **kwargs))
+
+    def test_unchanged_documents_are_skipped(self, harvester):
+        first = self.harvest(harvester)
+        assert len(first) == 50
+
+        assert self.harvest(harvester) == []
+
+    def test_unchanged_documents_may_be_included(self, harvester):
+        first = self.harvest(harvester)
+        again = self.harvest(harvester, unchanged=True)
+
+        assert [raw.pk for raw in again] == [raw.pk for raw in first]
+
+    def test_changed_documents_are_stored(self, harvester):
+        self.harvest(harvester)
+
+        # Change the first page and add a new one
+        encode, harvester.pages = harvester.encode_data, 6
+        harvester.encode_data = lambda datum: encode({**datum, 'changed': True} if datum['page'] == 0 else datum)
+
+        assert [raw.provider_doc_id for raw in self.harvest(harvester)] == [str(i) for i in range(10)] + [str(i) for i in range(50, 60)]
+
+    @pytest.mark.parametrize('batch_size, interrupt, checkpoint', [
+        # Interrupted part way through a page, after a batch ending part way through the previous page
+        (15, 22, {'count': 15, 'cursor': 1, 'offset': 5}),
+        # Interrupted after a batch ending on the last document of a page
+        (20, 27, {'count': 20, 'cursor': 1, 'offset': 10}),
+        # Interrupted before anything was committed
+        (20, 5, None),
+    ])
+    def test_resume(self, harvester, batch_size, interrupt, checkpoint):
+        checkpoints = []
+        harvester.batch_size, harvester.interrupt = batch_size, interrupt
+
+        with pytest.raises(ConnectionError):
+            self.harvest(harvester, on_checkpoint=checkpoints.append)
+
+        assert (checkpoints or [None])[-1] == checkpoint
+        assert RawData.objects.count() == (checkpoint or {}).get('count', 0)
+
+        harvester.interrupt = None
+        resumed = self.harvest(harvester, checkpoint=checkpoints[-1] if checkpoints else None, on_checkpoint=checkpoints.append)
+
+        # Documents stored before the interruption are neither yielded nor counted again
+        assert [raw.provider_doc_id for raw in resumed] == [str(i) for i in range((checkpoint or {}).get('count', 0), 50)]
+        assert checkpoints[-1] == {'count': 50, 'cursor': 4, 'offset': 10}
+        assert sorted(RawData.objects.values_list('provider_doc_id', flat=True), key=int) == [str(i) for i in range(50)]
+
+    def test_resume_first_page(self, harvester):
+        # The first page of some providers has no cursor, IE OAI-PMH before a resumption token has been given
+        checkpoints = []
+        harvester.first_cursor, harvester.batch_size, harvester.interrupt = None, 5, 7
+
+        with pytest.raises(ConnectionError):
+            self.harvest(harvester, on_checkpoint=checkpoints.append)
+
+        assert checkpoints[-1] == {'count': 5, 'cursor': None, 'offset': 5}
+
+        harvester.interrupt = None
+        resumed = self.harvest(harvester, checkpoint=checkpoints[-1], on_checkpoint=checkpoints.append)
+
+        assert [raw.provider_doc_id for raw in resumed] == [str(i) for i in range(5, 50)]
+        assert checkpoints[-1]['count'] == 50
+
+    def test_resume_legacy_checkpoint(self, harvester):
+        # Checkpoints without an offset resume from the start of the page at cursor
+        resumed = self.harvest(harvester, checkpoint={'count': 15, 'cursor': 1})
+
+        assert [raw.provider_doc_id for raw in resumed] == [str(i) for i in range(10, 50)]
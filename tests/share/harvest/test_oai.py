@@ -0,0 +1,148 @@
+import pytest
+
+from furl import furl
+
+from share.harvest.oai import OAIError
+from share.harvest.oai import OAIHarvester
+
+
+def make_page(page, token):
+    records = ''.join(
+        '<record><header><identifier>oai:{}:{}</identifier></header><metadata>Record {}</metadata></record>\n'.format(page, i, i)
+        for i in range(3)
+    )
+    token = '<resumptionToken>{}</resumptionToken>'.format(token) if token else '<resumptionToken completeListSize="9" cursor="6"/>'
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"><ListRecords>\n' + records + token + '</ListRecords></OAI-PMH>'
+    ).encode()
+
+
+PAGES = {
+    None: make_page(0, 'token1'),
+    'token1': make_page(1, 'token2'),
+    'token2': make_page(2, None),
+    'expired': (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"><error code="badResumptionToken">Token expired</error></OAI-PMH>'
+    ).encode(),
+}
+
+
+class MockResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), 10):
+            yield self.content[i:i + 10]
+
+    def close(self):
+        pass
+
+
+class MockSession:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return MockResponse(PAGES[furl(url).args.get('resumptionToken')])
+
+
+class MockConfig:
+    label = 'oai.test'
+    url = 'http://example.com/oai'
+    rate_limit = (100, 1)
+
+
+@pytest.fixture
+def harvester():
+    harvester = OAIHarvester(MockConfig())
+    harvester.session = MockSession()
+    return harvester
+
+
+class TestOAIHarvester:
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_fetch_records(self, harvester, streaming):
+        harvester.streaming = streaming
+        records = list(harvester.fetch_records(furl(harvester.url)))
+
+        assert len(records) == 9
+        assert len(harvester.session.urls) == 3
+        assert [doc_id for doc_id, _ in records[:4]] == ['oai:0:0', 'oai:0:1', 'oai:0:2', 'oai:1:0']
+        assert records[0][1] == b'<record xmlns="http://www.openarchives.org/OAI/2.0/"><header><identifier>oai:0:0</identifier></header><metadata>Record 0</metadata></record>\n'
+
+    def test_streaming_matches_fetch_page(self, harvester):
+        harvester.streaming = True
+        streamed = list(harvester.fetch_records(furl(harvester.url)))
+        harvester.streaming, harvester.cursor = False, None
+        fetched = list(harvester.fetch_records(furl(harvester.url)))
+
+        assert streamed == fetched
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_resume(self, harvester, streaming):
+        harvester.streaming = streaming
+        harvester.cursor = {'token': 'token1', 'expires': None}
+        records = list(harvester.fetch_records(furl(harvester.url)))
+
+        assert len(records) == 6
+        assert records[0][0] == 'oai:1:0'
+        assert furl(harvester.session.urls[0]).args['resumptionToken'] == 'token1'
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_resume_sets_cursor(self, harvester, streaming):
+        harvester.streaming = streaming
+        records = harvester.fetch_records(furl(harvester.url))
+
+        for _ in range(4):
+            next(records)
+
+        assert harvester.cursor == {'token': 'token1', 'expires': None}
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_resume_bad_token(self, harvester, streaming):
+        harvester.streaming = streaming
+        harvester.cursor = {'token': 'expired', 'expires': None}
+        records = list(harvester.fetch_records(furl(harvester.url)))
+
+        assert len(records) == 9
+        assert len(harvester.session.urls) == 4
+
+    def test_resume_expired_token(self, harvester):
+        harvester.cursor = {'token': 'token1', 'expires': '2000-01-01T00:00:00Z'}
+        records = list(harvester.fetch_records(furl(harvester.url)))
+
+        assert len(records) == 9
+        assert 'resumptionToken' not in furl(harvester.session.urls[0]).args
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_errors_raise(self, harvester, streaming):
+        harvester.streaming = streaming
+
+        with pytest.raises(OAIError) as e:
+            list(harvester.fetch_records(furl(harvester.url).set(args={'resumptionToken': 'expired'})))
+
+        assert e.value.code == 'badResumptionToken'
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_external_entities_are_not_resolved(self, harvester, streaming, tmpdir, monkeypatch):
+        secret = tmpdir.join('secret')
+        secret.write('top secret')
+        monkeypatch.setitem(PAGES, 'entities', make_page(0, None).replace(
+            b'<OAI-PMH',
+            '<!DOCTYPE OAI-PMH [<!ENTITY x SYSTEM "file://{}">]><OAI-PMH'.format(secret).encode()
+        ).replace(b'Record 0', b'&x;'))
+
+        harvester.streaming = streaming
+        harvester.cursor = {'token': 'entities', 'expires': None}
+        records = list(harvester.fetch_records(furl(harvester.url)))
+
+        assert len(records) == 3
+        assert all(b'top secret' not in record for _, record in records)
@@ -0,0 +1,116 @@
+import time
+import random
+import threading
+
+import arrow
+import pytest
+
+from furl import furl
+
+from share.harvest.paginated import PaginatedHarvester
+
+
+class MockResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class MockSession:
+    def __init__(self, total, page_size):
+        self.total = total
+        self.page_size = page_size
+        self.requested = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.requested.append(url)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        # Make pages finish out of order
+        time.sleep(random.random() / 100)
+
+        offset = int(furl(url).args.get('offset', 0))
+        with self.lock:
+            self.in_flight -= 1
+        return MockResponse({'total': self.total, 'items': list(range(offset, min(offset + self.page_size, self.total)))})
+
+
+class MockConfig:
+    label = 'paginated.test'
+    rate_limit = (1000, 1)
+
+
+class OffsetHarvester(PaginatedHarvester):
+    url = 'http://example.com/api'
+
+    def first_page(self, start_date, end_date):
+        return self.url
+
+    def page_urls(self, url, page):
+        return [furl(url).add(args={'offset': i}).url for i in range(len(page['items']), page['total'], len(page['items']))]
+
+    def get_records(self, page):
+        for item in page['items']:
+            yield (str(item), {'item': item})
+
+
+@pytest.fixture
+def harvester():
+    harvester = OffsetHarvester(MockConfig())
+    harvester.session = MockSession(total=1000, page_size=10)
+    return harvester
+
+
+class TestPaginatedHarvester:
+
+    def test_yields_in_order(self, harvester):
+        records = list(harvester.do_harvest(arrow.utcnow(), arrow.utcnow()))
+
+        assert [doc_id for doc_id, _ in records] == [str(i) for i in range(1000)]
+        assert len(harvester.session.requested) == 100
+
+    def test_bounded_concurrency(self, harvester):
+        harvester.concurrency = 3
+        list(harvester.do_harvest(arrow.utcnow(), arrow.utcnow()))
+
+        assert 1 < harvester.session.max_in_flight <= 3
+
+    def test_cursor(self, harvester):
+        records = harvester.do_harvest(arrow.utcnow(), arrow.utcnow())
+
+        for _ in range(25):
+            next(records)
+
+        assert harvester.cursor == 2
+
+    def test_resume(self, harvester):
+        harvester.cursor = 5
+        records = list(harvester.do_harvest(arrow.utcnow(), arrow.utcnow()))
+
+        assert [doc_id for doc_id, _ in records] == [str(i) for i in range(50, 1000)]
+        assert len(harvester.session.requested) == 96
+
+    def test_stopping_early(self, harvester):
+        harvester.concurrency = 3
+        records = harvester.do_harvest(arrow.utcnow(), arrow.utcnow())
+
+        for _ in range(15):
+            next(records)
+        records.close()
+        requested = len(harvester.session.requested)
+
+        # Nothing is left running once the caller has gone
+        assert harvester.session.in_flight == 0
+        assert requested <= 1 + 3 + 1
+        time.sleep(0.05)
+        assert len(harvester.session.requested) == requested
@@ -0,0 +1,138 @@
+import uuid
+import datetime
+
+import arrow
+import pytest
+from model_utils import Choices
+
+from share.harvest.planner import HarvestPlanner
+from share.models import CeleryProviderTask
+from share.tasks import HarvesterTask
+
+
+class MockConfig:
+    label = 'planner.test'
+
+
+class TestHarvestPlanner:
+
+    def test_daily(self):
+        windows = HarvestPlanner(MockConfig(), interval='day').plan(arrow.get('2016-01-01'), arrow.get('2016-01-04'))
+
+        assert windows == [
+            (arrow.get('2016-01-01'), arrow.get('2016-01-02')),
+            (arrow.get('2016-01-02'), arrow.get('2016-01-03')),
+            (arrow.get('2016-01-03'), arrow.get('2016-01-04')),
+        ]
+
+    def test_partial_window(self):
+        windows = HarvestPlanner(MockConfig(), interval='day').plan(arrow.get('2016-01-01'), arrow.get('2016-01-02T12:00:00'))
+
+        assert windows[-1] == (arrow.get('2016-01-02'), arrow.get('2016-01-02T12:00:00'))
+
+    def test_hourly(self):
+        windows = HarvestPlanner(MockConfig(), interval='hour').plan(arrow.get('2016-01-01'), arrow.get('2016-01-02'))
+
+        assert len(windows) == 24
+        assert all((end - start).total_seconds() == 3600 for start, end in windows)
+
+    def test_concurrency(self):
+        assert HarvestPlanner(MockConfig()).concurrency == HarvestPlanner.concurrency
+        assert HarvestPlanner(MockConfig(), concurrency=5).concurrency == 5
+
+    def test_invalid_interval(self):
+        with pytest.raises(AssertionError):
+            HarvestPlanner(MockConfig(), interval='fortnight')
+
+    @pytest.mark.django_db
+    def test_auto_without_history(self):
+        assert HarvestPlanner(MockConfig(), interval='auto').estimate_interval() == HarvestPlanner.INTERVALS['day']
+
+
+@pytest.mark.django_db
+class TestHarvestPlan:
+
+    WINDOWS = [(arrow.get('2016-01-0{}'.format(i)), arrow.get('2016-01-0{}'.format(i + 1))) for i in range(1, 6)]
+
+    @pytest.fixture
+    def dispatched(self, monkeypatch):
+        dispatched = []
+        monkeypatch.setattr(HarvesterTask, 'apply_async', lambda self, args, kwargs: dispatched.append(kwargs))
+        return dispatched
+
+    def harvest(self, share_source, kwargs, status, count=None):
+        checkpoint = {'range': {'start': kwargs['start'], 'end': kwargs['end']}, 'plan': kwargs['plan']}
+        if count is not None:
+            checkpoint['count'] = count
+        return CeleryProviderTask.objects.create(
+            uuid=uuid.uuid4(),
+            name='share.tasks.HarvesterTask',
+            app_label='planner.test',
+            status=status,
+            provider=share_source,
+            started_by=share_source,
+            checkpoint=checkpoint,
+        )
+
+    def test_concurrency_is_capped(self, share_source, dispatched):
+        plan_id = HarvestPlanner(MockConfig(), concurrency=2).dispatch(share_source, self.WINDOWS, resume=True, renormalize=True)
+
+        assert [kwargs['plan'] for kwargs in dispatched] == [{'id': plan_id, 'window': 0}, {'id': plan_id, 'window': 1}]
+        assert dispatched[0]['start'] == self.WINDOWS[0][0].isoformat()
+        assert dispatched[0]['end'] == self.WINDOWS[0][1].isoformat()
+        assert dispatched[0]['resume'] is True
+        assert dispatched[0]['renormalize'] is True
+
+    def test_finished_windows_advance_the_plan(self, share_source, dispatched):
+        plan_id = HarvestPlanner(MockConfig(), concurrency=2).dispatch(share_source, self.WINDOWS)
+
+        for window in range(2, 5):
+            assert HarvestPlanner.advance(plan_id) == window
+        assert HarvestPlanner.advance(plan_id) is None
+        assert [kwargs['plan']['window'] for kwargs in dispatched] == list(range(5))
+
+    def test_failed_windows_advance_the_plan(self, share_source, dispatched):
+        HarvestPlanner(MockConfig(), concurrency=1).dispatch(share_source, self.WINDOWS)
+
+        HarvesterTask().on_failure(ValueError(), str(uuid.uuid4()), ('planner.test', share_source.id), dispatched[0], None)
+
+        assert [kwargs['plan']['window'] for kwargs in dispatched] == [0, 1]
+
+    def test_progress(self, share_source, dispatched):
+        plan_id = HarvestPlanner(MockConfig(), concurrency=3).dispatch(share_source, self.WINDOWS)
+
+        # Windows are counted before any of them have started
+        progress = HarvestPlanner.progress(plan_id)
+        assert (progress['windows'], progress['pending'], progress['queued'], progress['started']) == (5, 2, 3, 0)
+
+        self.harvest(share_source, dispatched[0], CeleryProviderTask.STATUS.succeeded, count=10)
+        self.harvest(share_source, dispatched[1], CeleryProviderTask.STATUS.failed, count=5)
+        self.harvest(share_source, dispatched[2], CeleryProviderTask.STATUS.started)
+
+        progress = HarvestPlanner.progress(plan_id)
+        assert (progress['pending'], progress['queued'], progress['started'], progress['failed'], progress['succeeded']) == (2, 0, 1, 1, 1)
+        assert progress['documents'] == 15
+        assert progress['failures'] == [[dispatched[1]['start'], dispatched[1]['end']]]
+
+    def test_progress_is_not_translated(self, share_source, dispatched, monkeypatch):
+        statuses = CeleryProviderTask.STATUS
+        monkeypatch.setattr(CeleryProviderTask, 'STATUS', Choices(*((value, identifier, identifier.upper()) for identifier, value in statuses._identifier_map.items())))
+        plan_id = HarvestPlanner(MockConfig(), concurrency=1).dispatch(share_source, self.WINDOWS)
+        self.harvest(share_source, dispatched[0], statuses.failed)
+
+        progress = HarvestPlanner.progress(plan_id)
+
+        assert (progress['started'], progress['failed'], progress['succeeded']) == (0, 1, 0)
+        assert 'FAILED' not in progress
+
+    def test_auto_includes_empty_windows(self, share_source):
+        plan = {'id': uuid.uuid4().hex, 'window': 0}
+        # 100 documents found in 1 day, then none in the next 3
+        self.harvest(share_source, {'start': '2016-01-01T00:00:00+00:00', 'end': '2016-01-02T00:00:00+00:00', 'plan': plan}, CeleryProviderTask.STATUS.succeeded, count=100)
+        for day in range(2, 5):
+            self.harvest(share_source, {'start': '2016-01-0{}T00:00:00+00:00'.format(day), 'end': '2016-01-0{}T00:00:00+00:00'.format(day + 1), 'plan': plan}, CeleryProviderTask.STATUS.succeeded)
+
+        planner = HarvestPlanner(MockConfig(), interval='auto')
+        planner.target_size = 100
+
+        assert planner.estimate_interval() == datetime.timedelta(days=4)
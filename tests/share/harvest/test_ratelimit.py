@@ -0,0 +1,69 @@
+import time
+import threading
+
+import pytest
+
+from share.harvest.ratelimit import MemoryRateLimiter, FileRateLimiter
+
+
+@pytest.fixture(params=['memory', 'file'])
+def limiter_factory(request, tmpdir):
+    MemoryRateLimiter._buckets.clear()
+
+    def factory(key, calls, period):
+        if request.param == 'memory':
+            return MemoryRateLimiter(key, calls, period)
+        return FileRateLimiter(key, calls, period, directory=str(tmpdir))
+    return factory
+
+
+class TestRateLimiter:
+
+    def test_burst_does_not_wait(self, limiter_factory):
+        limiter = limiter_factory('burst', 5, 1)
+        assert [limiter.reserve() for _ in range(5)] == [0] * 5
+
+    def test_empty_bucket_waits(self, limiter_factory):
+        limiter = limiter_factory('empty', 2, 1)
+        limiter.reserve()
+        limiter.reserve()
+
+        assert 0.45 < limiter.reserve() <= 0.5
+        assert 0.95 < limiter.reserve() <= 1
+
+    def test_instances_share_bucket(self, limiter_factory):
+        first, second = limiter_factory('shared', 1, 1), limiter_factory('shared', 1, 1)
+
+        assert first.reserve() == 0
+        assert second.reserve() > 0.9
+
+    def test_keys_are_independent(self, limiter_factory):
+        first, second = limiter_factory('one', 1, 1), limiter_factory('two', 1, 1)
+
+        assert first.reserve() == 0
+        assert second.reserve() == 0
+
+    def test_threads(self, limiter_factory):
+        limiter = limiter_factory('threads', 10, 0.1)
+        start = time.monotonic()
+
+        threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(5)]) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 30 calls with a burst of 10 at 100 calls per second
+        assert time.monotonic() - start >= 0.19
+
+    def test_throttle(self, limiter_factory):
+        limiter = limiter_factory('throttle', 5, 1)
+        limiter.throttle(2)
+
+        assert 1.95 < limiter.reserve() <= 2
+        assert 2.15 < limiter.reserve() <= 2.2
+
+    def test_throttle_shared(self, limiter_factory):
+        limiter_factory('throttle_shared', 5, 1).throttle(3)
+
+        assert 2.95 < limiter_factory('throttle_shared', 5, 1).reserve() <= 3
@@ -0,0 +1,193 @@
+import threading
+import socketserver
+import http.server
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from share.harvest.session import HarvesterSession
+
+
+class MockAdapter(BaseAdapter):
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append((request, kwargs))
+        status, headers = self.responses.pop(0)
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers.update(headers)
+        resp.request = request
+        resp.url = request.url
+        resp._content = b''
+        return resp
+
+    def close(self):
+        pass
+
+
+class MockRateLimiter:
+    def __init__(self):
+        self.acquired = 0
+        self.throttled = []
+
+    def acquire(self):
+        self.acquired += 1
+
+    def throttle(self, seconds):
+        self.throttled.append(seconds)
+
+
+def make_session(responses, **kwargs):
+    session = HarvesterSession(rate_limiter=MockRateLimiter(), timeout=15, **kwargs)
+    session.adapter = MockAdapter(responses)
+    session.mount('http://', session.adapter)
+    return session
+
+
+class TestHarvesterSession:
+
+    def test_default_timeout(self):
+        session = make_session([(200, {})])
+        session.get('http://example.com')
+
+        assert session.adapter.requests[0][1]['timeout'] == 15
+        assert session.rate_limiter.acquired == 1
+
+    def test_retry_after_seconds(self):
+        session = make_session([(429, {'Retry-After': '7'}), (200, {})])
+        resp = session.get('http://example.com')
+
+        assert resp.status_code == 200
+        assert session.rate_limiter.acquired == 2
+        assert session.rate_limiter.throttled == [7]
+
+    def test_retry_after_date(self):
+        session = make_session([(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}), (200, {})])
+        session.get('http://example.com')
+
+        # Dates in the past do not need to be waited for
+        assert session.rate_limiter.throttled == [0]
+
+    def test_exponential_backoff(self):
+        session = make_session([(503, {}), (503, {}), (503, {}), (200, {})], backoff_factor=1)
+        session.get('http://example.com')
+
+        assert len(session.rate_limiter.throttled) == 3
+        for attempt, wait in enumerate(session.rate_limiter.throttled):
+            assert 0.5 * 2 ** attempt <= wait <= 1.5 * 2 ** attempt
+
+    def test_gives_up(self):
+        session = make_session([(429, {'Retry-After': '0'})] * 3, backoff_retries=2)
+
+        with pytest.raises(requests.HTTPError):
+            session.get('http://example.com')
+
+        assert session.rate_limiter.acquired == 3
+
+    def test_retry_after_too_long(self):
+        session = make_session([(429, {'Retry-After': '3600'})], max_backoff=60)
+
+        with pytest.raises(requests.HTTPError):
+            session.get('http://example.com')
+
+        assert session.rate_limiter.throttled == [60]
+
+    def test_other_errors_are_returned(self):
+        session = make_session([(500, {})])
+
+        assert session.get('http://example.com').status_code == 500
+
+
+class MockServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Counts the connections made to it. The first `drop` requests are disconnected without a response.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, drop=0):
+        super().__init__(('127.0.0.1', 0), MockHandler)
+        self.drop, self.connections, self.requests = drop, 0, 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.requests <= self.server.drop:
+            self.close_connection = True
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(request):
+    server = MockServer(drop=getattr(request, 'param', 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestHarvesterSessionConnections:
+
+    def url(self, server):
+        return 'http://127.0.0.1:{}/'.format(server.server_address[1])
+
+    def test_every_request_is_rate_limited(self, server):
+        session = HarvesterSession(rate_limiter=MockRateLimiter())
+
+        for _ in range(3):
+            session.get(self.url(server))
+
+        assert session.rate_limiter.acquired == 3
+
+    def test_connections_are_kept_alive(self, server):
+        session = HarvesterSession()
+
+        assert [session.get(self.url(server)).text for _ in range(3)] == ['ok'] * 3
+        assert server.connections == 1
+
+    def test_compression_is_negotiated(self):
+        assert 'gzip' in HarvesterSession().headers['Accept-Encoding']
+
+    @pytest.mark.parametrize('server', [2], indirect=True)
+    def test_dropped_connections_are_retried(self, server):
+        session = HarvesterSession(rate_limiter=MockRateLimiter(), retries=2)
+
+        assert session.get(self.url(server)).text == 'ok'
+        assert server.requests == 3
+        # Retries happen below the rate limiter, within a single request
+        assert session.rate_limiter.acquired == 1
+
+    @pytest.mark.parametrize('server', [2], indirect=True)
+    def test_retries_run_out(self, server):
+        session = HarvesterSession(retries=1)
+
+        with pytest.raises(requests.ConnectionError):
+            session.get(self.url(server))
+
+        assert server.requests == 2
+
+    def test_timeout_may_be_overridden(self):
+        session = make_session([(200, {}), (200, {})])
+        session.get('http://example.com', timeout=1)
+
+        assert session.adapter.requests[0][1]['timeout'] == 1
@@ -0,0 +1,54 @@
+import zlib
+
+import pytest
+
+from share.models.fields import CompressedTextField
+
+
+XML = '<record>{}</record>'.format('<dc:creator>Doe, Jane</dc:creator>' * 100)
+
+
+class TestCompressedTextField:
+
+    @pytest.fixture
+    def field(self):
+        return CompressedTextField()
+
+    def test_round_trip(self, field):
+        stored = field.get_prep_value(XML)
+
+        assert isinstance(stored, bytes)
+        assert stored[:1] == b'\x01'
+        assert zlib.decompress(stored[1:]) == XML.encode()
+        assert len(stored) < len(XML) / 5
+        assert field.from_db_value(stored, None, None, None) == XML
+
+    def test_memoryview(self, field):
+        # psycopg2 loads bytea as memoryviews
+        assert field.from_db_value(memoryview(field.get_prep_value(XML)), None, None, None) == XML
+
+    def test_bytes(self, field):
+        assert field.from_db_value(field.get_prep_value(XML.encode()), None, None, None) == XML
+
+    def test_unicode(self, field):
+        value = 'Ĉu vi parolas Esperanton? ' * 10
+        assert field.from_db_value(field.get_prep_value(value), None, None, None) == value
+
+    @pytest.mark.parametrize('value, stored', [
+        (None, None),
+        ('', b'\x00'),
+        ('tiny', b'\x00tiny'),
+    ])
+    def test_not_worth_compressing(self, field, value, stored):
+        assert field.get_prep_value(value) == stored
+        assert field.from_db_value(stored, None, None, None) == value
+
+    def test_unknown_header(self, field):
+        with pytest.raises(ValueError):
+            field.from_db_value(b'\x7fdata', None, None, None)
+
+    def test_disabled(self):
+        field = CompressedTextField(compression=None)
+
+        assert field.get_prep_value(XML) == b'\x00' + XML.encode()
+        assert field.deconstruct()[3] == {'compression': None}
@@ -1,7 +1,9 @@
 import pytest
 import hashlib
+import importlib
 
 from django.core import exceptions
+from django.db import connection
 from django.db.utils import IntegrityError
 
 from share.models import RawData
@@ -61,3 +63,73 @@ class TestRawData:
         assert rd1.pk == rd2.pk
         assert rd1.date_seen < rd2.date_seen
         assert rd1.date_harvested == rd2.date_harvested
+
+    def test_bulk_store_data(self, share_source):
+        stored = RawData.objects.bulk_store_data([('one', b'datum one'), ('two', b'datum two')], share_source, 'applabel')
+
+        assert [created for _, created in stored] == [True, True]
+        assert [rd.provider_doc_id for rd, _ in stored] == ['one', 'two']
+        assert RawData.objects.count() == 2
+
+        for rd, _ in stored:
+            from_db = RawData.objects.get(pk=rd.pk)
+            assert from_db.sha256 == rd.sha256 == hashlib.sha256(rd.data).hexdigest()
+            assert from_db.app_label == 'applabel'
+            assert from_db.source == share_source
+
+    def test_bulk_store_data_dedups(self, share_source):
+        rd = RawData.objects.store_data('one', b'datum one', share_source, 'applabel')
+        stored = RawData.objects.bulk_store_data([('one', b'datum one'), ('two', b'datum two'), ('one', b'datum one')], share_source, 'applabel')
+
+        assert [(x.pk, created) for x, created in stored] == [(rd.pk, False), (stored[1][0].pk, True), (rd.pk, False)]
+        assert RawData.objects.count() == 2
+        assert RawData.objects.get(pk=rd.pk).date_seen > rd.date_seen
+        assert RawData.objects.get(pk=rd.pk).date_harvested == rd.date_harvested
+
+    def test_bulk_store_data_empty(self, share_source):
+        assert RawData.objects.bulk_store_data([], share_source, 'applabel') == []
+
+    def test_data_is_compressed(self, share_source):
+        data = b'<record>' + b'<title>Compressible</title>' * 100 + b'</record>'
+        (rd, _), = RawData.objects.bulk_store_data([('one', data)], share_source, 'applabel')
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT data FROM share_rawdata WHERE id = %s', [rd.pk])
+            stored, = cursor.fetchone()
+
+        assert bytes(stored[:1]) == b'\x01'
+        assert len(stored) < len(data) / 5
+        assert RawData.objects.get(pk=rd.pk).data == data.decode()
+        assert RawData.objects.get(pk=rd.pk).sha256 == hashlib.sha256(data).hexdigest()
+
+    def test_data_column(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT atttypid::regtype::text, attstorage FROM pg_attribute WHERE attrelid = 'share_rawdata'::regclass AND attname = 'data'")
+            # Postgres should not try to compress the already compressed data
+            assert cursor.fetchone() == ('bytea', 'e')
+
+    def test_migrates_text_rows(self):
+        migration = importlib.import_module('share.migrations.0046_rawdata_data_bytea').Migration
+        alter = migration.operations[0].database_operations[0].sql[0].replace('share_rawdata', 'legacy_rawdata')
+
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE legacy_rawdata (id serial, data text)')
+            cursor.execute('INSERT INTO legacy_rawdata (data) VALUES (%s), (%s)', ['<record>Stored before compression</record>', 'Ünïcode'])
+            cursor.execute(alter)
+            cursor.execute('SELECT data FROM legacy_rawdata ORDER BY id')
+            migrated = [stored for stored, in cursor.fetchall()]
+
+        field = RawData._meta.get_field('data')
+        assert [field.from_db_value(stored, None, connection, None) for stored in migrated] == ['<record>Stored before compression</record>', 'Ünïcode']
+
+    def test_migration_is_reversible(self, share_source):
+        data = '<record>' + '<title>Compressible</title>' * 100 + '</record>'
+        RawData.objects.bulk_store_data([('one', data.encode()), ('two', b'Short')], share_source, 'applabel')
+        module = importlib.import_module('share.migrations.0046_rawdata_data_bytea')
+
+        module.uncompress_data(None, connection.schema_editor())
+        with connection.cursor() as cursor:
+            for sql in module.Migration.operations[0].database_operations[0].reverse_sql:
+                cursor.execute(sql)
+            cursor.execute('SELECT data FROM share_rawdata ORDER BY id')
+            assert [stored for stored, in cursor.fetchall()] == [data, 'Short']
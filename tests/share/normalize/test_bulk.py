@@ -0,0 +1,103 @@
+import pytest
+
+from share.models import NormalizedData, RawData
+from share.normalize.bulk import BulkNormalizer
+from share.tasks import MakeJsonPatches
+
+
+GRAPHS = {
+    'valid': {'@context': {}, '@graph': [{'@id': '_:1234', '@type': 'person', 'given_name': 'Jane', 'family_name': 'Doe'}]},
+    'empty': {'@context': {}, '@graph': []},
+    'invalid': {'@context': {}, '@graph': [{'@id': '_:1234', '@type': 'unicorn'}]},
+}
+
+
+class MockNormalizer:
+    def __init__(self, config):
+        pass
+
+    def normalize(self, data):
+        if data not in GRAPHS:
+            raise ValueError('Bad document')
+        return GRAPHS[data]
+
+
+class MockConfig:
+    label = 'bulk.test'
+    version = '0.0.1'
+    normalizer = MockNormalizer
+
+    def __init__(self, user):
+        self.user = user
+
+
+@pytest.fixture
+def raws(share_source):
+    return {
+        data: RawData.objects.store_data(data, data.encode(), share_source, 'bulk.test')
+        for data in ('valid', 'empty', 'invalid', 'broken')
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+class TestBulkNormalizer:
+
+    @pytest.fixture(autouse=True)
+    def patches(self, monkeypatch):
+        patches = []
+        monkeypatch.setattr(MakeJsonPatches, 'delay', lambda self, *args: patches.append(args))
+        return patches
+
+    @pytest.mark.parametrize('batch_size', [1, 3, 100])
+    def test_run(self, share_source, raws, patches, batch_size):
+        reports = []
+        normalizer = BulkNormalizer(MockConfig(share_source), workers=0, batch_size=batch_size)
+
+        progress = normalizer.run(RawData.objects.filter(app_label='bulk.test'), on_progress=reports.append)
+
+        normalized = NormalizedData.objects.get()
+        assert normalized.raw == raws['valid']
+        assert normalized.source == share_source
+        assert normalized.normalized_data == GRAPHS['valid']
+        assert patches == [(normalized.id, share_source.id)]
+
+        assert progress['processed'] == 4
+        assert (progress['succeeded'], progress['empty'], progress['unchanged'], progress['failed']) == (1, 1, 0, 2)
+        assert progress['errors'].keys() == {raws['invalid'].id, raws['broken'].id}
+        assert 'Bad document' in progress['errors'][raws['broken'].id]
+        # Progress is always reported once finished
+        assert reports[-1] == {key: value for key, value in progress.items() if key != 'errors'}
+
+    @pytest.mark.parametrize('itersize, batch_size', [(1, 1), (2, 3), (3, 2), (4, 4)])
+    def test_pages(self, share_source, raws, itersize, batch_size):
+        normalizer = BulkNormalizer(MockConfig(share_source), workers=0, batch_size=batch_size, itersize=itersize)
+
+        assert [row[0] for row in normalizer.rows(RawData.objects.filter(app_label='bulk.test'))] == sorted(raw.id for raw in raws.values())
+
+        # Each batch is stored on the connection RawData are being read from, between pages
+        progress = normalizer.run(RawData.objects.filter(app_label='bulk.test'))
+
+        assert (progress['succeeded'], progress['empty'], progress['unchanged'], progress['failed']) == (1, 1, 0, 2)
+        assert NormalizedData.objects.get().raw == raws['valid']
+
+    def test_queryset(self, share_source, raws):
+        progress = BulkNormalizer(MockConfig(share_source), workers=0).run(RawData.objects.filter(id=raws['valid'].id))
+
+        assert progress['processed'] == 1
+        assert NormalizedData.objects.count() == 1
+
+    def test_unchanged(self, share_source, raws, patches):
+        BulkNormalizer(MockConfig(share_source), workers=0).run(RawData.objects.filter(app_label='bulk.test'))
+        progress = BulkNormalizer(MockConfig(share_source), workers=0).run(RawData.objects.filter(app_label='bulk.test'))
+
+        # Failures are always tried again
+        assert (progress['succeeded'], progress['empty'], progress['unchanged'], progress['failed']) == (0, 0, 2, 2)
+        assert NormalizedData.objects.count() == 1
+        assert len(patches) == 1
+
+    def test_force(self, share_source, raws):
+        BulkNormalizer(MockConfig(share_source), workers=0).run(RawData.objects.filter(app_label='bulk.test'))
+        progress = BulkNormalizer(MockConfig(share_source), workers=0, force=True).run(RawData.objects.filter(app_label='bulk.test'))
+
+        assert (progress['succeeded'], progress['empty'], progress['unchanged'], progress['failed']) == (1, 1, 0, 2)
+        assert NormalizedData.objects.count() == 2
@@ -0,0 +1,138 @@
+import copy
+import json
+
+import xmltodict
+import pytest
+
+from share.normalize import ctx
+from share.normalize import XPath
+from share.normalize.document import XMLConverter
+
+
+SOLR = '''<doc>
+    <str name="id">10.1371/journal.pone.0001</str>
+    <arr name="author_display"><str>Jane Doe</str><str>John Roe</str></arr>
+    <str name="title_display">A <i>title</i> with mixed content</str>
+    <!-- Comments are dropped -->
+    <arr name="abstract"><str>
+        Some abstract
+    </str></arr>
+    <empty/>
+    <empty a="1"/>
+</doc>'''
+
+JATS = '''<?xml version="1.0" encoding="UTF-8"?>
+<article xmlns:xlink="http://www.w3.org/1999/xlink" article-type="research-article">
+    <front><article-meta>
+        <article-id pub-id-type="doi">10.7554/eLife.00001</article-id>
+        <contrib-group>
+            <contrib contrib-type="author"><name><surname>Doe</surname><given-names>Jane</given-names></name></contrib>
+            <contrib contrib-type="author"><collab>A Group</collab></contrib>
+        </contrib-group>
+        <permissions><license xlink:href="http://creativecommons.org/licenses/by/4.0/"><license-p>Open access</license-p></license></permissions>
+        <kwd-group><kwd>one</kwd><kwd>two</kwd></kwd-group>
+    </article-meta></front>
+</article>'''
+
+OAI = '''<record xmlns="http://www.openarchives.org/OAI/2.0/">
+    <header><identifier>oai:example:1</identifier><setSpec>a</setSpec><setSpec>b</setSpec></header>
+    <metadata>
+        <oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+            <dc:title xml:lang="en">Title</dc:title>
+            <dc:creator>A</dc:creator>
+            <dc:creator>B</dc:creator>
+        </oai_dc:dc>
+    </metadata>
+</record>'''
+
+NAMESPACES = {
+    'http://purl.org/dc/elements/1.1/': 'dc',
+    'http://www.openarchives.org/OAI/2.0/': None,
+    'http://www.openarchives.org/OAI/2.0/oai_dc/': None,
+    'http://www.w3.org/1999/xlink': None,
+}
+
+
+class TestXMLConverter:
+
+    @pytest.mark.parametrize('data', [SOLR, JATS, OAI])
+    @pytest.mark.parametrize('namespaces', [NAMESPACES, {}, None])
+    def test_matches_xmltodict(self, data, namespaces):
+        expected = xmltodict.parse(data, process_namespaces=True, namespaces=namespaces)
+        actual = XMLConverter(namespaces).parse(data)
+
+        assert actual == expected
+        assert list(actual.items()) == list(expected.items())
+
+    @pytest.mark.parametrize('data, path', [
+        (SOLR, "str[@name='title_display']"),
+        (SOLR, "arr[@name='author_display']"),
+        (SOLR, "arr[@name='abstract']/str"),
+        (SOLR, 'missing'),
+        (JATS, '//article-meta/contrib-group/contrib[name]'),
+        (JATS, '//article-meta/contrib-group/contrib[not(name)]'),
+        (JATS, '//permissions/license/license-p'),
+        (JATS, '//kwd'),
+    ])
+    def test_xpath_matches_unparsing(self, data, path):
+        chain = XPath(ctx, path).chain()[0]
+
+        assert chain.run(XMLConverter(NAMESPACES).parse(data)) == chain.run(xmltodict.parse(data, process_namespaces=True, namespaces=NAMESPACES))
+
+    def test_xpath_on_part_of_a_document(self):
+        chain = XPath(ctx, '//kwd').chain()[0]
+        front = XMLConverter(NAMESPACES).parse(JATS)['article']['front']
+
+        assert front.xpath_root.getparent() is not None
+        assert chain.run(front) == [{'kwd': 'one'}, {'kwd': 'two'}]
+        assert XPath(ctx, '..').chain()[0].run(front) == []
+
+    def test_external_entities_are_not_resolved(self, tmpdir):
+        secret = tmpdir.join('secret')
+        secret.write('top secret')
+        data = '<!DOCTYPE doc [<!ENTITY x SYSTEM "file://{}">]><doc><a>before &x; after</a><b>&x;</b></doc>'.format(secret)
+
+        actual = XMLConverter().parse(data)
+
+        assert 'top secret' not in json.dumps(actual)
+        assert actual == xmltodict.parse(data)
+
+
+class TestLazyXMLDict:
+
+    def test_only_builds_what_is_looked_up(self):
+        doc = XMLConverter(NAMESPACES).parse(JATS)
+        meta = doc['article']['front']['article-meta']
+
+        assert meta['kwd-group'] == {'kwd': ['one', 'two']}
+        # Siblings and the children of what was looked up are left untouched
+        permissions = dict.__getitem__(meta, 'permissions')
+        assert permissions._pending
+        assert dict.__len__(permissions) == 0
+
+        contrib = meta['contrib-group']['contrib'][0]
+        assert dict.__len__(contrib) == 2
+        assert dict.__getitem__(contrib, 'name')._pending
+
+    def test_xpath_root_without_xpath(self):
+        doc = XMLConverter(NAMESPACES, xpath=False).parse(JATS)
+
+        assert doc.xpath_root is None
+        assert doc['article']['front'].xpath_root is None
+
+    @pytest.mark.parametrize('data', [SOLR, JATS, OAI])
+    def test_json(self, data):
+        expected = xmltodict.parse(data, process_namespaces=True, namespaces=NAMESPACES)
+        actual = XMLConverter(NAMESPACES).parse(data)
+
+        assert json.dumps(actual) == json.dumps(expected)
+        for key in expected:
+            assert json.dumps(XMLConverter(NAMESPACES).parse(data)[key]) == json.dumps(expected[key])
+
+    def test_copy(self):
+        front = XMLConverter(NAMESPACES).parse(JATS)['article']['front']
+        copied = front.copy()
+
+        assert copied == front
+        assert copied.xpath_root is front.xpath_root
+        assert copy.deepcopy(front) == front
@@ -1,4 +1,7 @@
+import pytest
+
 from share.normalize import *  # noqa
+from share.normalize.links import AbstractLink
 
 
 EXAMPLE = {
@@ -54,3 +57,47 @@ class TestParser:
     def test_parser(self):
         parsed = Manuscript(EXAMPLE).parse()
         assert ctx.pool[parsed]['extra'] == {'type': 'paper', 'defined_type': 'paper'}
+
+    def test_chains_are_compiled(self):
+        assert Manuscript.parsers['title']._steps is not None
+        assert Manuscript._extra['type']._steps is not None
+
+    def test_fields_are_looked_up_once(self, monkeypatch):
+        Manuscript(EXAMPLE).parse()
+        monkeypatch.setattr(Manuscript, 'model', property(lambda self: pytest.fail('Looked up the model again')))
+
+        ctx.clear()
+        Manuscript(EXAMPLE).parse()
+
+        fields = {field.name: field for field in Manuscript(EXAMPLE).fields}
+        assert fields['title'].is_relation is False
+        assert fields['contributors'].many_to_many is True
+        assert fields['contributors'].m2m_field_name == 'creative_work'
+
+    def test_fields_are_per_parser(self):
+        overridden = Manuscript.using(title=ctx.description)
+
+        assert overridden(EXAMPLE).fields is not Manuscript(EXAMPLE).fields
+        assert {field.name: field.chain for field in overridden(EXAMPLE).fields}['title'] is overridden.parsers['title']
+
+    def test_frames_only_recorded_when_debugging(self, monkeypatch):
+        frames = []
+        monkeypatch.setattr(ctx, 'frames', frames)
+
+        class Recorder(AbstractLink):
+            def execute(self, obj):
+                frames_seen.append(len(frames))
+                return obj
+
+        frames_seen = []
+        chain = (ctx.title + Recorder()).chain()[0]
+
+        chain.run(EXAMPLE)
+        monkeypatch.setattr(AbstractLink, 'debug', True)
+        chain.run(EXAMPLE)
+
+        assert frames_seen == [0, 2]
+        assert frames == []
+
+    def test_index(self):
+        assert Map(ctx('index'), ctx.authors).chain()[0].run(EXAMPLE) == list(range(12))
@@ -0,0 +1,156 @@
+import arrow
+import pytest
+
+from share.normalize import ctx
+from share.normalize import ParseName
+from share.normalize.document import XMLConverter
+from share.normalize.links import DateParserLink
+from share.normalize.links import DictHashingDict
+from share.normalize.links import LanguageParserLink
+from share.normalize.links import NameParserLink
+
+
+class TestDictHashingDict:
+
+    @pytest.mark.parametrize('key, equal', [
+        ({'a': 1, 'b': [1, {'c': 2}]}, {'a': 1, 'b': [1, {'c': 2}]}),
+        ([1, 2, 3], (1, 2, 3)),
+        (({'a': 1}, 'person'), ({'a': 1}, 'person')),
+        ('string', 'string'),
+    ])
+    def test_keys_compare_by_value(self, key, equal):
+        pool = DictHashingDict()
+        pool[key] = 'value'
+
+        assert equal in pool
+        assert pool[equal] == 'value'
+        assert pool.get(equal) == 'value'
+
+    @pytest.mark.parametrize('key, other', [
+        ({'a': 1}, {'a': 2}),
+        ({'a': 1}, {'b': 1}),
+        ({'a': [1]}, {'a': [1, 2]}),
+        ({'a': 1}, [('a', 1)]),
+    ])
+    def test_different_keys(self, key, other):
+        pool = DictHashingDict()
+        pool[key] = 'value'
+
+        assert other not in pool
+        assert pool.get(other) is None
+
+    def test_fingerprints_are_cached(self):
+        pool = DictHashingDict()
+        key = {'authors': [{'name': str(i)} for i in range(1000)]}
+        pool[key, 'creativework'] = 'value'
+
+        fingerprinted, fingerprint = [], pool._fingerprint
+        pool._fingerprint = lambda structure: fingerprinted.append(structure) or fingerprint(structure)
+
+        assert (key, 'creativework') in pool
+        assert key['authors'][10] not in pool
+        # Only the tuple wrapping the key is fingerprinted again
+        assert len(fingerprinted) == 1
+
+    def test_lazy_documents_are_not_built(self):
+        data = '<doc><a x="1"><b y="1">text</b></a><a x="1"><b y="1">text</b></a><a x="2"/></doc>'
+        pool = DictHashingDict()
+        first, second, third = XMLConverter().parse(data)['doc']['a']
+        pool[first] = 'value'
+
+        assert second in pool
+        assert third not in pool
+        assert dict.__getitem__(first, 'b')._pending
+
+
+class TestLanguageParserLink:
+
+    @pytest.mark.parametrize('value, expected', [
+        ('en', 'eng'),
+        ('eng', 'eng'),
+        ('English', 'eng'),
+        (' english ', 'eng'),
+        ('EN', 'eng'),
+        ('fre', 'fra'),
+        ('fra', 'fra'),
+        ({'#text': 'French'}, 'fra'),
+        ('Not a language', None),
+        ('', None),
+        (None, None),
+    ])
+    def test_parse(self, value, expected):
+        assert LanguageParserLink().execute(value) == expected
+
+    def test_cached(self):
+        LanguageParserLink.lookup.cache_clear()
+        for _ in range(3):
+            LanguageParserLink().execute('English')
+
+        assert LanguageParserLink.lookup.cache_info().hits == 2
+
+
+class TestNameParserLink:
+
+    def test_names_are_parsed_once(self):
+        NameParserLink.parse.cache_clear()
+        chains = [ParseName(ctx).first.chain()[0], ParseName(ctx).last.chain()[0], ParseName(ctx).suffix.chain()[0]]
+
+        assert [chain.run('Jane Q. Doe Jr.') for chain in chains] == ['Jane', 'Doe', 'Jr.']
+        assert NameParserLink.parse.cache_info().misses == 1
+        assert NameParserLink.parse.cache_info().hits == 2
+
+    def test_distinct_names(self):
+        assert NameParserLink().execute('Jane Doe').first == 'Jane'
+        assert NameParserLink().execute('John Doe').first == 'John'
+        assert NameParserLink().execute('Jane Doe') is NameParserLink().execute('Jane Doe')
+
+    def test_shared_names_are_immutable(self):
+        name = NameParserLink().execute('jane doe')
+
+        with pytest.raises(AttributeError):
+            name.first = 'Jane'
+        assert not hasattr(name, 'capitalize')
+        assert NameParserLink().execute('jane doe').first == 'jane'
+
+    def test_parts(self):
+        name = NameParserLink().execute('Dr. Jane Q. Doe Jr.')
+
+        assert (name.title, name.first, name.middle, name.last, name.suffix) == ('Dr.', 'Jane', 'Q.', 'Doe', 'Jr.')
+        assert name['last'] == name[3] == 'Doe'
+
+
+class TestDateParserLink:
+
+    @pytest.mark.parametrize('date, fast', [
+        ('2016-06-08', True),
+        ('2016-06-08T10:11:12Z', True),
+        ('2016-06-08T10:11:12', True),
+        ('2016-06-08 10:11:12', True),
+        ('2016-06-08T10:11Z', True),
+        ('2016-06-08T23:11:12-05:00', True),
+        ('2016-06-08T01:11:12+0530', True),
+        ('2016-06-08T10:11:12.5Z', True),
+        ('2016-06-08T10:11:12.123456+01:00', True),
+        ('2016-12-31T23:00:00-02:00', True),
+        ('2016', False),
+        ('2016-06-08T10:11:12.1234567Z', False),
+    ])
+    def test_matches_arrow(self, date, fast):
+        assert bool(DateParserLink.ISO_8601.match(date)) is fast
+        assert DateParserLink().execute(date) == arrow.get(date).to('UTC').isoformat()
+
+    @pytest.mark.parametrize('date', ['2016-02-30', '2016-13-01T00:00:00Z'])
+    def test_invalid(self, date):
+        with pytest.raises(Exception):
+            DateParserLink().execute(date)
+
+    @pytest.mark.parametrize('date', [None, ''])
+    def test_empty(self, date):
+        assert DateParserLink().execute(date) is None
+
+    def test_cached(self):
+        DateParserLink.parse.cache_clear()
+        for _ in range(3):
+            DateParserLink().execute('2016-06-08T10:11:12Z')
+
+        assert DateParserLink.parse.cache_info().hits == 2
@@ -1,6 +1,9 @@
 import xmltodict
 
+from django.apps import apps
+
 from share.normalize import *  # noqa
+from share.normalize.oai import OAICreativeWork
 
 
 EXAMPLE = '''
@@ -57,6 +60,16 @@ factor, to within chemical accuracy, for CI calculations.
   </entry>
 '''
 
+OAI_EXAMPLE = '''<record xmlns="http://www.openarchives.org/OAI/2.0/">
+    <header><identifier>oai:example:1</identifier><datestamp>2016-01-01T00:00:00Z</datestamp></header>
+    <metadata>
+        <oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+            <dc:title>Title</dc:title>
+            <dc:type>{}</dc:type>
+        </oai_dc:dc>
+    </metadata>
+</record>'''
+
 
 class Organization(Parser):
     name = ctx
@@ -103,3 +116,26 @@ class TestParser:
         assert isinstance(parsed, dict)
         assert parsed['@type'] == 'preprint'
         assert ctx.pool[parsed]['extra'] == {'comment': '11 pages, 6 figures, 3 tables, LaTeX209, submitted to The Journal of\n  Chemical Physics', 'journal_ref': 'J. Chem. Phys. 115, 1626 (2001)'}
+
+    def test_fields_are_looked_up_per_schema(self, monkeypatch):
+        looked_up = []
+        monkeypatch.setattr(OAICreativeWork, '_fields', {}, raising=False)
+        monkeypatch.setattr(OAICreativeWork, 'model', property(lambda self: looked_up.append(self.schema) or apps.get_model('share', self.schema)))
+
+        types = []
+        for resource_type in ('preprint', 'article', 'preprint'):
+            ctx.clear()
+            parsed = OAICreativeWork(xmltodict.parse(
+                OAI_EXAMPLE.format(resource_type),
+                process_namespaces=True,
+                namespaces={
+                    'http://purl.org/dc/elements/1.1/': 'dc',
+                    'http://www.openarchives.org/OAI/2.0/': None,
+                    'http://www.openarchives.org/OAI/2.0/oai_dc/': None,
+                }
+            )).parse()
+            types.append(parsed['@type'])
+            assert ctx.pool[parsed]['title'] == 'Title'
+
+        assert types == ['Preprint', 'CreativeWork', 'Preprint']
+        assert looked_up == ['Preprint', 'CreativeWork']
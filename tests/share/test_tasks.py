@@ -0,0 +1,317 @@
+import uuid
+
+import pytest
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from share.models import CeleryProviderTask, NormalizedData, NormalizationRecord, RawData
+from share.tasks import BatchNormalizerTask, HarvesterTask, MakeJsonPatches, NormalizerTask
+
+
+class MockConfig:
+    label = 'tasks.test'
+    version = '0.0.1'
+
+    def __init__(self, user):
+        self.user = user
+
+    def normalizer(self, config):
+        return None
+
+
+class Retry(Exception):
+    pass
+
+
+@pytest.fixture
+def task(share_source, monkeypatch):
+    task = BatchNormalizerTask()
+    task.config = MockConfig(share_source)
+    task.started_by = share_source
+    task.task = CeleryProviderTask(checkpoint=None)
+    task.retried = []
+
+    def retry(args=None, **kwargs):
+        task.retried.append(args)
+        return Retry()
+
+    monkeypatch.setattr(task, 'retry', retry)
+    return task
+
+
+@pytest.fixture
+def raws(share_source):
+    return [RawData.objects.store_data(str(i), 'datum {}'.format(i).encode(), share_source, 'tasks.test') for i in range(4)]
+
+
+@pytest.mark.django_db
+class TestBatchNormalizerTask:
+
+    def test_records_outcomes(self, task, raws, monkeypatch):
+        def normalize(normalizer, raw, force=False):
+            if raw.provider_doc_id == '1':
+                raise ValueError('Bad document')
+            return raw.provider_doc_id != '2' or None
+
+        monkeypatch.setattr(task, 'normalize', normalize)
+
+        with pytest.raises(Retry):
+            task.do_run([raw.id for raw in raws] + [-1])
+
+        assert task.task.checkpoint['succeeded'] == [raws[0].id, raws[3].id]
+        assert task.task.checkpoint['empty'] == [raws[2].id]
+        assert task.task.checkpoint['failed'].keys() == {str(raws[1].id), '-1'}
+        assert 'Bad document' in task.task.checkpoint['failed'][str(raws[1].id)]
+        # Only documents that exist are retried
+        assert task.retried == [('tasks.test', task.started_by.id, [raws[1].id])]
+
+    def test_retry_keeps_outcomes(self, task, raws, monkeypatch):
+        monkeypatch.setattr(task, 'normalize', lambda normalizer, raw, force=False: True)
+        task.task.checkpoint = {'succeeded': [raws[0].id], 'empty': [], 'failed': {str(raws[1].id): 'Error'}}
+
+        task.do_run([raws[1].id])
+
+        assert task.retried == []
+        assert task.task.checkpoint == {'succeeded': [raws[0].id, raws[1].id], 'empty': [], 'failed': {}}
+
+
+@pytest.mark.django_db
+class TestNormalizerSubmit:
+
+    @pytest.fixture
+    def task(self, share_source, monkeypatch):
+        task = NormalizerTask()
+        task.config = MockConfig(share_source)
+        task.task = CeleryProviderTask.objects.create(
+            uuid=uuid.uuid4(),
+            status=CeleryProviderTask.STATUS.started,
+            provider=share_source,
+            started_by=share_source,
+        )
+        task.patches = []
+        monkeypatch.setattr(MakeJsonPatches, 'delay', lambda self, *args: task.patches.append(args))
+        return task
+
+    def test_submit(self, task, share_source):
+        raw = RawData.objects.store_data('one', b'datum', share_source, 'tasks.test')
+        graph = {'@context': {}, '@graph': [{'@id': '_:1234', '@type': 'person', 'given_name': 'Jane', 'family_name': 'Doe'}]}
+
+        normalized = task.submit(raw, graph)
+
+        from_db = NormalizedData.objects.get(pk=normalized.pk)
+        assert from_db.raw == raw
+        assert from_db.source == share_source
+        assert from_db.normalized_data == graph
+        assert list(from_db.tasks.all()) == [task.task]
+        assert task.patches == [(normalized.id, share_source.id)]
+
+    def test_submit_invalid(self, task, share_source):
+        raw = RawData.objects.store_data('one', b'datum', share_source, 'tasks.test')
+
+        with pytest.raises(ValidationError):
+            task.submit(raw, {'@context': {}, '@graph': [{'@id': '_:1234', '@type': 'unicorn'}]})
+
+        assert NormalizedData.objects.count() == 0
+        assert task.patches == []
+
+
+@pytest.mark.django_db
+class TestNormalizationRecords:
+
+    GRAPH = {'@context': {}, '@graph': [{'@id': '_:1234', '@type': 'person', 'given_name': 'Jane', 'family_name': 'Doe'}]}
+
+    class MockNormalizer:
+        def __init__(self, graph):
+            self.graph = graph
+            self.calls = 0
+
+        def normalize(self, raw):
+            self.calls += 1
+            # Blank node ids are different every time
+            return {**self.graph, '@graph': [{**node, '@id': '_:{}'.format(uuid.uuid4().hex)} for node in self.graph['@graph']]}
+
+    @pytest.fixture
+    def task(self, share_source, monkeypatch):
+        task = NormalizerTask()
+        task.config = MockConfig(share_source)
+        task.submitted = []
+        monkeypatch.setattr(task, 'submit', lambda raw, graph: task.submitted.append(graph) or raw)
+        share_source.robot = 'tasks.test'  # Submitted in process
+        return task
+
+    @pytest.fixture
+    def raw(self, share_source):
+        return RawData.objects.store_data('one', b'datum', share_source, 'tasks.test')
+
+    def test_same_version_is_skipped(self, task, raw):
+        normalizer = self.MockNormalizer(self.GRAPH)
+
+        assert task.normalize(normalizer, raw) == raw
+        assert task.normalize(normalizer, raw) is None
+        assert normalizer.calls == 1
+        assert len(task.submitted) == 1
+
+        record = NormalizationRecord.objects.get()
+        assert (record.sha256, record.app_label, record.app_version) == (raw.sha256, 'tasks.test', '0.0.1')
+        assert record.graph_sha256 == NormalizationRecord.graph_digest(task.submitted[0])
+
+    def test_new_version_with_same_graph(self, task, raw):
+        normalizer = self.MockNormalizer(self.GRAPH)
+        task.normalize(normalizer, raw)
+        task.config.version = '0.0.2'
+
+        assert task.normalize(normalizer, raw) is None
+        assert normalizer.calls == 2
+        assert len(task.submitted) == 1
+        assert NormalizationRecord.objects.filter(app_version='0.0.2').exists()
+
+    def test_new_version_with_earlier_graph(self, task, raw):
+        graph = {**self.GRAPH, '@graph': [{**self.GRAPH['@graph'][0], 'given_name': 'John'}]}
+
+        task.normalize(self.MockNormalizer(self.GRAPH), raw)
+        task.config.version = '0.0.2'
+        task.normalize(self.MockNormalizer(graph), raw)
+        task.config.version = '0.0.3'
+
+        # Only the latest graph is live, going back to an earlier one is a change
+        assert task.normalize(self.MockNormalizer(self.GRAPH), raw) == raw
+        assert len(task.submitted) == 3
+
+    def test_failed_patches_are_forgotten(self, task, raw):
+        normalizer = self.MockNormalizer(self.GRAPH)
+        task.normalize(normalizer, raw)
+        normalized = NormalizedData.objects.create(created_at=timezone.now(), normalized_data=task.submitted[0], source=task.config.user, raw=raw)
+
+        MakeJsonPatches().on_failure(ValueError(), str(uuid.uuid4()), (normalized.id, task.config.user.id), {}, None)
+
+        assert not NormalizationRecord.objects.exists()
+        assert task.normalize(normalizer, raw) == raw
+
+    def test_new_version_with_new_graph(self, task, raw):
+        task.normalize(self.MockNormalizer(self.GRAPH), raw)
+        task.config.version = '0.0.2'
+        graph = {**self.GRAPH, '@graph': [{**self.GRAPH['@graph'][0], 'given_name': 'John'}]}
+
+        assert task.normalize(self.MockNormalizer(graph), raw) == raw
+        assert len(task.submitted) == 2
+
+    def test_empty_graphs_are_recorded(self, task, raw):
+        normalizer = self.MockNormalizer({'@context': {}, '@graph': []})
+
+        assert task.normalize(normalizer, raw) is None
+        assert task.normalize(normalizer, raw) is None
+        assert normalizer.calls == 1
+        assert NormalizationRecord.objects.get().graph_sha256 is None
+
+    def test_force(self, task, raw):
+        normalizer = self.MockNormalizer(self.GRAPH)
+        task.normalize(normalizer, raw)
+
+        assert task.normalize(normalizer, raw, force=True) == raw
+        assert len(task.submitted) == 2
+        assert NormalizationRecord.objects.count() == 1
+
+    def test_record(self):
+        NormalizationRecord.objects.record([('a', '1'), ('b', None)], 'tasks.test', '0.0.1')
+        original = NormalizationRecord.objects.get(sha256='a')
+
+        # Documents recorded again are updated in place, the last graph given for a document wins
+        NormalizationRecord.objects.record([('a', '2'), ('c', '3'), ('c', '4')], 'tasks.test', '0.0.1')
+        NormalizationRecord.objects.record([], 'tasks.test', '0.0.1')
+
+        assert set(NormalizationRecord.objects.values_list('sha256', 'graph_sha256')) == {('a', '2'), ('b', None), ('c', '4')}
+        assert NormalizationRecord.objects.get(sha256='a').id == original.id
+
+    def test_graph_digest(self):
+        graph = {'@graph': [
+            {'@id': '_:a', '@type': 'person', 'name': 'Jane'},
+            {'@id': '_:b', '@type': 'contributor', 'person': {'@id': '_:a', '@type': 'person'}},
+        ]}
+        renamed = {'@graph': [
+            {'@id': '_:c', '@type': 'person', 'name': 'Jane'},
+            {'@id': '_:d', '@type': 'contributor', 'person': {'@id': '_:c', '@type': 'person'}},
+        ]}
+        swapped = {'@graph': [
+            {'@id': '_:a', '@type': 'person', 'name': 'Jane'},
+            {'@id': '_:b', '@type': 'contributor', 'person': {'@id': '_:b', '@type': 'person'}},
+        ]}
+
+        assert NormalizationRecord.graph_digest(graph) == NormalizationRecord.graph_digest(renamed)
+        assert NormalizationRecord.graph_digest(graph) != NormalizationRecord.graph_digest(swapped)
+
+
+@pytest.mark.django_db
+class TestHarvesterTaskResume:
+
+    WINDOW = {'start': '2016-01-01T00:00:00+00:00', 'end': '2016-01-02T00:00:00+00:00'}
+
+    @pytest.fixture
+    def config(self, share_source, paged_harvester):
+        config = MockConfig(share_source)
+        config.disabled = False
+        config.batch_size = 15
+        config.harvester = paged_harvester
+        return config
+
+    def make_task(self, config, monkeypatch):
+        task = HarvesterTask()
+        task.config = config
+        task.started_by = config.user
+        task.task = CeleryProviderTask.objects.create(
+            uuid=uuid.uuid4(),
+            name=task.name,
+            app_label=config.label,
+            app_version=config.version,
+            status=CeleryProviderTask.STATUS.started,
+            provider=config.user,
+            started_by=config.user,
+        )
+        task.push_request(id=str(task.task.uuid), retries=0)
+        task.normalized = []
+        monkeypatch.setattr(task, 'normalize', task.normalized.extend)
+        monkeypatch.setattr(task, 'retry', lambda **kwargs: Retry())
+        return task
+
+    def test_resume(self, config, monkeypatch):
+        config.harvester.interrupt = 22
+        first = self.make_task(config, monkeypatch)
+
+        with pytest.raises(Retry):
+            first.do_run(**self.WINDOW)
+
+        first.task.status = CeleryProviderTask.STATUS.failed
+        first.task.save()
+        assert CeleryProviderTask.objects.get(pk=first.task.pk).checkpoint == {'count': 15, 'cursor': 1, 'offset': 5, 'range': self.WINDOW, **self.WINDOW}
+        assert RawData.objects.count() == 15
+
+        config.harvester.interrupt = None
+        second = self.make_task(config, monkeypatch)
+        second.do_run(resume=True, **self.WINDOW)
+
+        # Documents committed before the interruption are neither stored nor counted again
+        assert CeleryProviderTask.objects.get(pk=second.task.pk).checkpoint == {'count': 50, 'cursor': 4, 'offset': 10, 'range': self.WINDOW, **self.WINDOW}
+        assert sorted(RawData.objects.values_list('provider_doc_id', flat=True), key=int) == [str(i) for i in range(50)]
+        assert sorted(RawData.objects.get(pk=raw_id).provider_doc_id for raw_id in second.normalized) == sorted(str(i) for i in range(15, 50))
+
+    def test_finished_ranges_are_not_resumed(self, config, monkeypatch):
+        first = self.make_task(config, monkeypatch)
+        first.do_run(**self.WINDOW)
+        first.task.status = CeleryProviderTask.STATUS.succeeded
+        first.task.save()
+
+        second = self.make_task(config, monkeypatch)
+        second.window = self.WINDOW
+
+        assert second.find_checkpoint() is None
+
+    def test_other_ranges_are_not_resumed(self, config, monkeypatch):
+        config.harvester.interrupt = 22
+        first = self.make_task(config, monkeypatch)
+        with pytest.raises(Retry):
+            first.do_run(**self.WINDOW)
+
+        second = self.make_task(config, monkeypatch)
+        second.window = {**self.WINDOW, 'end': '2016-01-03T00:00:00+00:00'}
+
+        assert second.find_checkpoint() is None